@@ -1,45 +1,311 @@
 # Builtin
+import argparse
+import asyncio
 import logging
+import subprocess
+import sys
+import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 # Pip
 import discord
 # Custom
 import Config
+from Utils.CommandSync import CommandSync
+from Utils.ExtensionLoader import ExtensionLoader
+from Utils.FastRuntime import enable as enableFastRuntime
+from Utils.LeanGateway import cacheReport, cogRequirements, leanOptions, missingRequirements
+from Utils.Logging import setupQueuedLogging
+from Utils.Metrics import metrics
+from Utils.Paginator import persistent_paginators
 
 # Path variables
 rootDirectory = Path(__file__).parent
-logPath = rootDirectory.joinpath("Debug Files").joinpath("bot.log")
+
+
+# Parses a shard range like '0-3' or '0,2,4' into a list of shard IDs
+def parseShardIds(value: str) -> List[int]:
+    shardIds = []
+    for part in value.split(","):
+        start, _, end = part.partition("-")
+        shardIds.extend(range(int(start), int(end or start)+1))
+    return shardIds
+
+
+# Command line arguments which override the sharding config so shard groups can run as separate processes
+parser = argparse.ArgumentParser(description="Runs BobBot.")
+parser.add_argument("--shard-count", type=int, default=getattr(Config, "shardCount", None), help="The total amount of shards across every process.")
+parser.add_argument("--shard-ids", type=parseShardIds, default=getattr(Config, "shardIds", None), help="The shards this process runs, e.g. 0-3.")
+parser.add_argument("--processes", type=int, default=1, help="Splits the shards evenly over this many processes on this host.")
+parser.add_argument("--lazy", action="store_true", default=getattr(Config, "lazyExtensions", False), help="Loads extensions in the background or on first use.")
+parser.add_argument("--lean", action="store_true", default=getattr(Config, "leanGateway", False), help="Only enables the intents and caches the loaded cogs need.")
+parser.add_argument("--fast", action="store_true", default=getattr(Config, "fastRuntime", False), help="Uses uvloop if it is installed.")
+parser.add_argument("--profile-imports", action="store_true", help="Logs how long each extension and module took to import.")
+parser.add_argument("--metrics-port", type=int, default=getattr(Config, "metricsPort", None), help="The local port to serve metrics on. Each process from --processes uses the next one along.")
+arguments = parser.parse_args()
+
+# Spawn a process for each shard group and wait for them to finish
+if arguments.processes > 1:
+    if arguments.shard_count is None:
+        parser.error("--shard-count is required when using --processes")
+    shardIds = arguments.shard_ids or list(range(arguments.shard_count))
+    # Every other option is passed through unchanged so each process runs in the same mode
+    forwarded, skipNext = [], False
+    for argument in sys.argv[1:]:
+        if skipNext:
+            skipNext = False
+        elif argument in ("--processes", "--shard-count", "--shard-ids", "--metrics-port"):
+            skipNext = True
+        elif not argument.startswith(("--processes=", "--shard-count=", "--shard-ids=", "--metrics-port=")):
+            forwarded.append(argument)
+    # Each process needs its own metrics port since they all run on the same host
+    metricsPorts = [["--metrics-port", str(arguments.metrics_port+i)] if arguments.metrics_port is not None else [] for i in range(arguments.processes)]
+    processes = [subprocess.Popen([sys.executable, __file__, "--shard-count", str(arguments.shard_count), "--shard-ids", ",".join(map(str, shardIds[i::arguments.processes])), *metricsPorts[i], *forwarded])
+                 for i in range(arguments.processes)]
+    sys.exit(max(process.wait() for process in processes))
+
+# Each shard group gets its own log file so processes don't write over each other
+logName = f"bot-{'-'.join(map(str, arguments.shard_ids))}.log" if arguments.shard_ids else "bot.log"
+logPath = rootDirectory.joinpath("Debug Files").joinpath(logName)
+extensionManifestPath = rootDirectory.joinpath("Cache Files").joinpath("extensions.json")
+commandManifestPath = rootDirectory.joinpath("Cache Files").joinpath("commands.json")
+metricsSnapshotPath = rootDirectory.joinpath("Debug Files").joinpath(logName.replace(".log", "-metrics.json"))
+
+
+# Guilds to register commands in. None registers them globally
+commandGuildIds: Optional[List[int]] = getattr(Config, "commandGuildIds", None)
+# Overrides the guilds specific commands are registered in, e.g. {"stats": [682249251543449601]}
+commandScopes: Dict[str, Optional[List[int]]] = getattr(Config, "commandScopes", {})
 
 
 # Subclass to add global bot functionality
-class BobBot(discord.Bot):
+class BobBot(discord.AutoShardedBot):
     def __init__(self, *args, **options):
-        super().__init__(*args, **options)
+        # Commands are synced from the manifest instead so the library must never run its own full sync
+        super().__init__(*args, auto_sync_commands=False, **options)
         self.errorColor = discord.Color.from_rgb(0, 0, 0)
+        self.shardEvents: Dict[int, asyncio.Event] = {}
+        self.firstShardReady = asyncio.Event()
+        self.extensionLoader = ExtensionLoader(self, extensionManifestPath, profile=arguments.profile_imports)
+        self.commandSync = CommandSync(self.http, commandManifestPath)
+        self.extensionTasks: Dict[str, asyncio.Task] = {}
+        self.commandTasks: Dict[str, asyncio.Task] = {}
+
+    async def on_connect(self) -> None:
+        await self.syncCommands()
+
+    def commandGuilds(self, command: discord.ApplicationCommand) -> List[Optional[int]]:
+        """Applies the configured scope to a command and returns the guilds it is registered in, with None meaning globally."""
+        command.guild_ids = commandScopes.get(command.name, command.guild_ids or commandGuildIds)
+        return command.guild_ids or [None]
+
+    def mapCommandIds(self) -> None:
+        """Lets the library route interactions to the loaded commands using the IDs in the manifest so they work before a sync."""
+        for command in self.pending_application_commands:
+            for guildId in self.commandGuilds(command):
+                commandId = self.commandSync.registeredId(guildId, command.name)
+                if commandId is not None:
+                    command.id = str(commandId)
+                    self._application_commands[command.id] = command
+
+    async def syncCommands(self) -> None:
+        """Registers, updates and deletes only the commands which changed since the last sync."""
+        scopes: Dict[Optional[int], Dict[str, Dict[str, Any]]] = {}
+        for command in self.pending_application_commands:
+            payload = command.to_dict()
+            for guildId in self.commandGuilds(command):
+                scopes.setdefault(guildId, {})[command.name] = payload
+        # Commands from lazy extensions aren't added yet so they are kept instead of being deleted from Discord
+        keep = {name for commands in self.extensionLoader.pending.values() for name in commands}
+        results = await self.commandSync.sync(self.user.id, scopes, keep)
+        self.mapCommandIds()
+        logger.info(f"Synced commands: {({scope: {key: value for key, value in result.items() if key != 'ids'} for scope, result in results.items()})}")
+
+    def startExtension(self, extension: str) -> asyncio.Task:
+        """Loads a pending extension and starts its cogs, sharing the work with every interaction waiting on the same extension."""
+        task = self.extensionTasks.get(extension)
+        if task is None:
+            async def loadAndStart() -> None:
+                cogs = await self.extensionLoader.loadPending(extension)
+                self.mapCommandIds()
+                await startCogs(cogs)
+
+            task = self.extensionTasks[extension] = asyncio.create_task(loadAndStart())
+            for command in self.extensionLoader.pending[extension]:
+                self.commandTasks[command] = task
+        return task
+
+    def extensionStarting(self, name: str) -> Optional[asyncio.Task]:
+        """Gets the task loading and starting the extension which provides a command if it hasn't finished yet."""
+        extension = self.extensionLoader.extensionForCommand(name)
+        if extension is not None:
+            return self.startExtension(extension)
+        task = self.commandTasks.get(name)
+        return task if task is not None and not task.done() else None
+
+    async def on_interaction(self, interaction: discord.Interaction) -> None:
+        # Load the extension which provides this command if it hasn't been loaded yet
+        if interaction.type is discord.InteractionType.auto_complete:
+            if self.extensionStarting(interaction.data["name"]) is not None:
+                # Autocomplete can't be deferred so answer with nothing while the extension starts
+                await interaction.response.send_autocomplete_result(choices=[])
+                return
+        elif interaction.type is discord.InteractionType.application_command:
+            task = self.extensionStarting(interaction.data["name"])
+            if task is not None:
+                # Starting the cogs can take much longer than the 3 seconds Discord waits for an acknowledgement
+                await interaction.response.defer()
+                await asyncio.shield(task)
+        elif interaction.type is discord.InteractionType.component:
+            # Persistent paginator buttons are named after the command which sent them so its extension can be loaded too
+            sourceName = persistent_paginators.source_name(interaction)
+            if sourceName is not None:
+                task = self.extensionStarting(sourceName)
+                if task is not None:
+                    await interaction.response.defer()
+                    await asyncio.shield(task)
+                await persistent_paginators.handle(interaction)
+                return
+        await self.process_application_commands(interaction)
+
+    async def on_shard_ready(self, shardId: int) -> None:
+        self.shardEvents.setdefault(shardId, asyncio.Event()).set()
+        logger.info(f"Shard {shardId} ready: {self.shardReport().get(shardId)}")
+        # Start the cogs when the first shard is ready and let them set up each following shard individually
+        if not self.firstShardReady.is_set():
+            self.firstShardReady.set()
+            return
+        for cog in self.cogs.values():
+            if hasattr(cog, "shardStartup"):
+                self.loop.create_task(cog.shardStartup(shardId))
+
+    async def waitUntilShardReady(self, shardId: Optional[int] = None) -> None:
+        """Waits until a specific shard is ready or until any shard is ready if no shard is given."""
+        if shardId is None:
+            await self.firstShardReady.wait()
+        else:
+            await self.shardEvents.setdefault(shardId, asyncio.Event()).wait()
+
+    def shardReport(self) -> Dict[int, Dict[str, float]]:
+        """Returns the latency and guild count of each shard run by this process."""
+        report = {shardId: {"latency": latency, "guilds": 0} for shardId, latency in self.latencies}
+        for guild in self.guilds:
+            if guild.shard_id in report:
+                report[guild.shard_id]["guilds"] += 1
+        return report
+
+
+# Results of every cog which has been started so far
+cogStartupResults: Dict[str, Dict[str, Any]] = {}
+
+
+# Runs a single cog's startup function once the cogs it depends on have started
+async def startCog(name: str, cog: discord.Cog, tasks: Dict[str, asyncio.Task]) -> Dict[str, Any]:
+    # Cogs can declare the names of the cogs they need to be started first
+    for dependency in getattr(cog, "startupDependencies", []):
+        if dependency in tasks:
+            dependencyResult = await asyncio.shield(tasks[dependency])
+        elif dependency in cogStartupResults:
+            dependencyResult = cogStartupResults[dependency]
+        else:
+            return {"cog": name, "status": "skipped", "duration": 0.0, "error": f"Missing dependency {dependency}"}
+        if dependencyResult["status"] != "ok":
+            return {"cog": name, "status": "skipped", "duration": 0.0, "error": f"Dependency {dependency} {dependencyResult['status']}"}
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(cog.startup(), timeout=getattr(cog, "startupTimeout", 60))
+        status, error = "ok", None
+    except asyncio.TimeoutError:
+        status, error = "timeout", None
+    except Exception as exception:
+        logger.exception(f"Cog {name} failed to start")
+        status, error = "failed", repr(exception)
+    return {"cog": name, "status": status, "duration": time.perf_counter()-start, "error": error}
+
+
+# Starts a group of cogs concurrently so a slow or broken cog doesn't hold up the rest
+async def startCogs(names: List[str]) -> List[Dict[str, Any]]:
+    tasks: Dict[str, asyncio.Task] = {}
+    for name in names:
+        tasks[name] = asyncio.create_task(startCog(name, bot.cogs[name], tasks))
+    results = list(await asyncio.gather(*tasks.values()))
+    cogStartupResults.update((result["cog"], result) for result in results)
+    return results
 
 
 # Function which runs once the bot is set up and running
 async def startup() -> None:
-    await bot.wait_until_ready()
+    await bot.waitUntilShardReady()
+    try:
+        await metrics.start(port=arguments.metrics_port, snapshotPath=metricsSnapshotPath)
+    except OSError:
+        # Metrics are only for monitoring so the cogs still have to start if the port is taken
+        logger.exception(f"Couldn't serve metrics on port {arguments.metrics_port}")
     # Run startup functions for each cog
-    for cog in bot.cogs.values():
-        await cog.startup()
-    await bot.get_channel(817807544482922496).send("Running")
+    start = time.perf_counter()
+    results = await startCogs(list(bot.cogs))
+    total = time.perf_counter()-start
+    logger.info(f"Cog startup finished in {total:.2f}s: {results}")
+    caches = cacheReport(bot)
+    logger.info(f"Gateway caches: {caches}")
+    # The channel may belong to a shard run by another process
+    channel = bot.get_channel(817807544482922496)
+    if channel is not None:
+        reportEmbed = discord.Embed(title=f"Running (started in {total:.2f}s)", colour=discord.Color.green() if all(result["status"] == "ok" for result in results) else discord.Color.red())
+        for result in results:
+            reportEmbed.add_field(name=result["cog"], value=f"{result['status']} in {result['duration']:.2f}s" + (f"\n{result['error']}" if result["error"] else ""), inline=False)
+        reportEmbed.add_field(name="Gateway caches", value="\n".join(f"{name}: {value:.6g}" for name, value in caches.items()), inline=False)
+        await channel.send(embed=reportEmbed)
+    # Load any lazy extensions which haven't been used yet in the background
+    for extension in list(bot.extensionLoader.pending):
+        await asyncio.shield(bot.startExtension(extension))
+    # Register the commands from the lazy extensions now they have all been added
+    if arguments.lazy:
+        await bot.syncCommands()
+    if arguments.profile_imports:
+        logger.info(f"Extension load times:\n{bot.extensionLoader.report()}")
+
+
+# Extensions to load
+extensions = [f"Cogs.{file.name.replace('.py', '')}" for file in rootDirectory.joinpath("Cogs").glob("*.py")]
 
+# The lean gateway mode needs to know what every extension needs before connecting, so it falls back to the library defaults
+# until every extension has been loaded once and recorded in the manifest
+manifest = ExtensionLoader.readManifest(extensionManifestPath)
+gatewayOptions = leanOptions(manifest.get(extension, {}).get("requirements") for extension in extensions) if arguments.lean else None
+
+# The event loop has to be swapped before the bot is created since it grabs the loop straight away
+fastRuntime = enableFastRuntime() if arguments.fast else None
 
 # Discord variables
-bot = BobBot()
+bot = BobBot(shard_count=arguments.shard_count, shard_ids=arguments.shard_ids, **(gatewayOptions or {}))
+bot.before_invoke(metrics.beforeCommand)
+bot.after_invoke(metrics.afterCommand)
 
 # Setup automatic logging for debugging
 logger = logging.getLogger("discord")
 logger.setLevel(logging.DEBUG)
-handler = logging.FileHandler(filename=logPath, encoding="utf-8", mode="a")
-handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s:%(message)s'))
-logger.addHandler(handler)
+# Records are written by a background thread so disk writes never block the event loop
+logWriter = setupQueuedLogging(logger,
+                               logPath,
+                               jsonLines=getattr(Config, "logJson", False),
+                               rateLimits=getattr(Config, "logRateLimits", {"discord.gateway": (1, 50), "discord.voice_client": (0.1, 10)}))
+
+if fastRuntime is not None:
+    logger.info(f"Performance runtime: {fastRuntime}")
 
 # Load extensions
-for extension in [f"Cogs.{file.name.replace('.py', '')}" for file in rootDirectory.joinpath("Cogs").glob("*.py")]:
-    bot.load_extension(extension)
+bot.extensionLoader.discover(extensions, arguments.lazy)
+if arguments.lean and gatewayOptions is None:
+    logger.warning("Lean gateway mode is using the default intents and caches until every extension is in the manifest. Restart to apply it")
+elif gatewayOptions is not None:
+    for name, cog in bot.cogs.items():
+        missing = missingRequirements(bot, cogRequirements(cog))
+        if any(missing.values()):
+            logger.warning(f"Cog {name} needs {missing} which the lean gateway mode didn't enable. Restart to apply it")
+
+# Route interactions using the command IDs from the last sync until the bot connects and syncs again
+bot.mapCommandIds()
 
 # Start discord bot
 bot.loop.create_task(startup())
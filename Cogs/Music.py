@@ -1,53 +1,810 @@
 # Builtin
+import asyncio
+import time
 from math import ceil
-from typing import TYPE_CHECKING, Optional, List, Any
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, List, Any, Dict, Iterable, Tuple, Union
 # Pip
 import discord
 import lavapy
 from lavapy.ext import spotify
 # Custom
 import Config
-from Utils.Paginator import Paginator
+from Utils.CommandScheduler import CommandScheduler
+from Utils.CompactQueue import CompactQueue
+from Utils.Metrics import metrics
+from Utils.NodeBalancer import NodeBalancer
+from Utils.Paginator import Paginator, PageSource, PaginatorRegistry, persistent_paginators
+from Utils.PlayHistory import PlayHistory
+from Utils.PlayerReaper import PlayerReaper
+from Utils.PlayerStateStore import PlayerStateStore
+from Utils.Prefetcher import Prefetcher, RateLimiter
+from Utils.SearchCache import SearchCache
+from Utils.TrackStore import TrackStore
 
 if TYPE_CHECKING:
     from BobBot import BobBot
 
+# Path variables
+trackStorePath = Path(__file__).parent.parent.joinpath("Cache Files").joinpath("tracks.db")
+playerStatePath = Path(__file__).parent.parent.joinpath("Cache Files").joinpath("players.db")
+
+# Lavalink nodes to connect to. Each one needs a host, port, password, region and identifier
+lavalinkNodes = getattr(Config, "lavalinkNodes", [{"host": "192.168.1.227",
+                                                   "port": 2333,
+                                                   "password": "",
+                                                   "region": "london",
+                                                   "identifier": "Main Node"}])
+
+# Whether players store their queue as compact entries instead of full tracks to save memory on huge queues
+compactQueues = getattr(Config, "compactQueues", False)
+
+# How many /queue paginators can be live per guild and in total and how long they last without being used
+paginatorLimits = getattr(Config, "paginatorLimits", {"perGuild": 3, "total": 500, "timeout": 120})
+
+# Bounds the amount of live paginators so stale pages don't build up in memory
+paginatorRegistry = PaginatorRegistry(max_per_guild=paginatorLimits["perGuild"], max_total=paginatorLimits["total"])
+
+# Whether /queue encodes its pages in the buttons so they keep working after a restart without holding a view in memory
+persistentQueuePages = getattr(Config, "persistentQueuePages", False)
+
+# How many seconds a player can be idle, paused or alone in its channel before it is disconnected. None never disconnects it
+reaperTimeouts = getattr(Config, "reaperTimeouts", {"idle": 300, "paused": 900, "alone": 120})
+
+# Whether a disconnected player's queue is saved so it can be brought back with /restore
+reaperSnapshots = getattr(Config, "reaperSnapshots", True)
+
+# Disconnects unused players so they stop holding Lavalink and voice resources
+playerReaper = PlayerReaper(reaperTimeouts)
+
+# How many played tracks /play suggests from globally, per guild and for how many guilds
+playHistoryLimits = getattr(Config, "playHistoryLimits", {"global": 5000, "perGuild": 200, "guilds": 1000})
+
+# Suggests previously played tracks while a /play query is being typed
+playHistory = PlayHistory(maxGlobal=playHistoryLimits["global"], maxPerGuild=playHistoryLimits["perGuild"], maxGuilds=playHistoryLimits["guilds"])
+
+# Stops commands in the same guild from changing its player at the same time
+commandScheduler = CommandScheduler()
+
+# Places players on the least loaded node
+nodeBalancer = NodeBalancer()
+
+# Saves every player's state so it can be resumed after a restart
+playerStateStore = PlayerStateStore(playerStatePath)
+
+# Limits how fast every player combined can resolve partial tracks in the background
+prefetchRateLimiter = RateLimiter(10, 1)
+
+
+# Keeps pre-formatted queue lines in sync with a player's queue so pages can be rendered in O(page size)
+class QueueView:
+    pageSize = 20
+    maxDescription = 4096
+    maxLineLength = 180
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.pageLengths: List[int] = []
+        self.current: int = 0
+        # Increased on every change so rendered pages know when they are out of date
+        self.revision: int = 0
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @property
+    def pageCount(self) -> int:
+        """Returns the amount of pages needed to display the queue."""
+        return len(self.pageLengths)
+
+    def clampPage(self, page: int) -> int:
+        """Limits a page number to the pages the queue has now since paginators keep the page count they were created with."""
+        return max(0, min(page, self.pageCount-1))
+
+    @classmethod
+    def formatTrack(cls, track: Union[lavapy.Track, lavapy.PartialResource]) -> str:
+        """
+        Formats a track into the line which is displayed in the queue.
+
+        Parameters
+        ----------
+        track: Union[lavapy.Track, lavapy.PartialResource]
+            The track to format.
+
+        Returns
+        -------
+        str
+            The formatted line ('track - author name' for full tracks).
+        """
+        if isinstance(track, lavapy.PartialResource):
+            line = f"{track.query} (Partial)"
+        else:
+            line = f"{track.title} - {track.author}"
+        if len(line) > cls.maxLineLength:
+            line = f"{line[:cls.maxLineLength-3]}..."
+        return line
+
+    def _updatePageLengths(self, startPage: int) -> None:
+        """Recalculates the character length of every page from a given page onwards."""
+        del self.pageLengths[startPage:]
+        for start in range(startPage*self.pageSize, len(self.lines), self.pageSize):
+            self.pageLengths.append(sum(len(line)+1 for line in self.lines[start:start+self.pageSize]))
+
+    def extend(self, tracks: Iterable[Union[lavapy.Track, lavapy.PartialResource]]) -> None:
+        """Appends a batch of tracks to the end of the view."""
+        startPage = len(self.lines)//self.pageSize
+        self.lines.extend(self.formatTrack(track) for track in tracks)
+        self._updatePageLengths(startPage)
+        self.revision += 1
+
+    def replace(self, index: int, track: Union[lavapy.Track, lavapy.PartialResource]) -> None:
+        """Replaces the line at a given index with a new track."""
+        oldLine = self.lines[index]
+        self.lines[index] = self.formatTrack(track)
+        self.pageLengths[index//self.pageSize] += len(self.lines[index])-len(oldLine)
+        self.revision += 1
+
+    def rebuild(self, tracks: List[Union[lavapy.Track, lavapy.PartialResource]], current: int) -> None:
+        """Rebuilds the whole view from a list of tracks and the index of the current one."""
+        self.lines = [self.formatTrack(track) for track in tracks]
+        self.current = current
+        self._updatePageLengths(0)
+        self.revision += 1
+
+    def clear(self) -> None:
+        """Removes every line from the view."""
+        self.lines.clear()
+        self.pageLengths.clear()
+        self.current = 0
+        self.revision += 1
+
+    def advance(self, step: int) -> None:
+        """Moves the current position by a given amount."""
+        self.current = max(0, min(self.current+step, len(self.lines)-1))
+        self.revision += 1
+
+    def renderPage(self, page: int) -> str:
+        """
+        Renders a single page of the queue.
+
+        Parameters
+        ----------
+        page: int
+            The zero-indexed page to render.
+
+        Returns
+        -------
+        str
+            The page's description which is guaranteed to fit inside an embed.
+        """
+        page = self.clampPage(page)
+        start = page*self.pageSize
+        lines = self.lines[start:start+self.pageSize]
+        if not lines:
+            return "The queue is empty"
+        # Work out the space taken up by the position numbers and the current track marker
+        overhead = sum(len(str(start+position+1))+2 for position in range(len(lines)))+2
+        maxLength = None
+        if self.pageLengths[page]+overhead > self.maxDescription:
+            maxLength = (self.maxDescription-overhead)//len(lines)-1
+        description = ""
+        for position, line in enumerate(lines, start=start):
+            # Display currently playing track
+            if position == self.current:
+                description += "► "
+            if maxLength is not None and len(line) > maxLength:
+                line = f"{line[:maxLength-3]}..."
+            description += f"{position+1}. {line}\n"
+        return description
+
 
 # Custom Lavapy Player class to add additional functionality
 class CustomPlayer(lavapy.Player):
     def __init__(self, bot, channel: discord.VoiceChannel) -> None:
         super().__init__(bot, channel)
+        if compactQueues:
+            self._queue = CompactQueue(self)
         self.context: Optional[discord.ApplicationContext] = None
+        self.textChannel: Optional[discord.abc.Messageable] = None
+        self.searchCache: Optional[SearchCache] = None
+        self.queueView = QueueView()
+        self.queueVersion = 0
+        self.prefetcher = Prefetcher(self.resolvePartial, prefetchRateLimiter)
+        nodeBalancer.place(self)
 
-    async def playNext(self) -> None:
-        # Test if the queue is empty
-        if self.queue.isEmpty:
-            # All tracks done so disconnect and cleanup
-            await self.context.send("Finished playing all tracks. Disconnecting")
-            await self.destroy()
+    async def connect(self, *args, **kwargs) -> None:
+        await super().connect(*args, **kwargs)
+        # Only tracked once connected so a failed connect doesn't leave a stale player behind
+        nodeBalancer.add(self)
+
+    def assignNode(self, node: lavapy.Node) -> None:
+        """Sets the node this player sends its audio through."""
+        self._node = node
+
+    async def moveToNode(self, node: lavapy.Node) -> None:
+        """
+        Moves this player to another node keeping its queue, position and volume.
+
+        Parameters
+        ----------
+        node: lavapy.Node
+            The node to move to.
+        """
+        track, position, volume, paused = self.track, self.position, self.volume, self.isPaused
+        # Lavapy routes a node's events to the players in its list so the player has to move lists too
+        if self in self.node.players:
+            self.node.players.remove(self)
+        self.assignNode(node)
+        node.players.append(self)
+        # Rejoining the channel makes Discord send a fresh voice server update which lavapy forwards to the new node
+        await self.guild.change_voice_state(channel=None)
+        await self.guild.change_voice_state(channel=self.channel)
+        if track is not None:
+            # Lavapy reports the position in seconds but takes the start time in milliseconds
+            await self.play(track, startTime=int(position*1000), volume=volume, pause=paused)
+
+    @property
+    def position(self) -> float:
+        """Returns the position of the current track in seconds, counting it as 0 until Lavalink sends the first player update."""
+        if self._lastUpdateTime is None or self._lastPosition is None:
+            return 0
+        return super().position
+
+    @property
+    def queuePosition(self) -> int:
+        """Returns the index of the current track as tracked by the queue itself."""
+        if isinstance(self.queue, CompactQueue):
+            return self.queue.position
+        # Lavapy's queue is at -1 until the first track plays. Tracks aren't searched for by equality since playing a
+        # partial track creates a new track object
+        return max(self.queue.currentTrack, 0)
+
+    def syncQueueView(self) -> None:
+        """Rebuilds the queue view if it has drifted from the actual queue."""
+        try:
+            tracks = self.queue.tracks
+        except lavapy.QueueEmpty:
+            self.queueView.clear()
+            return
+        position = self.queuePosition
+        if len(tracks) != len(self.queueView):
+            self.queueView.rebuild([self.prefetcher.substitute(track) for track in tracks], position)
+        elif self.queueView.current != position:
+            self.queueView.advance(position-self.queueView.current)
+
+    async def resolvePartial(self, partial: lavapy.PartialResource) -> Optional[lavapy.Track]:
+        """Resolves a partial track the same way lavapy does, going through the search cache if there is one."""
+        if self.searchCache is not None:
+            return await self.searchCache.resolve(self.node, partial)
+        return await SearchCache.fetchPartial(self.node, partial)
+
+    def schedulePrefetch(self) -> None:
+        """Starts resolving the partial tracks coming up next in the queue."""
+        self.syncQueueView()
+        try:
+            tracks = self.queue.tracks
+        except lavapy.QueueEmpty:
+            return
+        self.prefetcher.schedule(tracks, self.queuePosition, self._partialResolved)
+
+    def _partialResolved(self, index: int, partial: lavapy.PartialResource, track: lavapy.Track) -> None:
+        """Shows a resolved track in the queue view if it is still in the same place."""
+        try:
+            tracks = self.queue.tracks
+        except lavapy.QueueEmpty:
+            return
+        if index < len(tracks) and index < len(self.queueView) and tracks[index] is partial:
+            self.queueView.replace(index, track)
+
+    def enqueue(self, result: Union[lavapy.Track, lavapy.PartialResource, lavapy.MultiTrack]) -> None:
+        """Adds a search result to the queue and the queue view in one batch."""
+        self.enqueueMany([result])
+
+    def enqueueMany(self, results: List[Union[lavapy.Track, lavapy.PartialResource, lavapy.MultiTrack]]) -> None:
+        """Adds multiple search results to the queue and the queue view as a single change."""
+        tracks = []
+        for result in results:
+            if isinstance(result, lavapy.MultiTrack):
+                tracks.extend(result.tracks)
+            else:
+                tracks.append(result)
+        self.queue.addIterable(tracks)
+        self.queueView.extend(tracks)
+        self.notifyQueueChanged("enqueue")
+        self.schedulePrefetch()
+
+    async def playResult(self, result: Union[lavapy.Track, lavapy.PartialResource, lavapy.MultiTrack]) -> None:
+        """Starts playing a search result when nothing is playing."""
+        if isinstance(self.queue, CompactQueue):
+            # The compact queue has to hold every track itself so lavapy never sees the full playlist
+            start = len(self.queue)
+            self.enqueue(result)
+            track = self.queue.skipTo(start)
+            self.queueView.current = start
+            await self.play(self.prefetcher.pop(track))
         else:
-            # Play the next track
-            await self.play(self.queue.next())
+            await self.play(result)
+        self.schedulePrefetch()
+
+    def nextTrack(self) -> Union[lavapy.Track, lavapy.PartialResource]:
+        """Gets the next track in the queue and moves the queue view along."""
+        track = self.queue.next()
+        self.queueView.advance(1)
+        self.schedulePrefetch()
+        return self.prefetcher.pop(track)
+
+    def previousTrack(self) -> Union[lavapy.Track, lavapy.PartialResource]:
+        """Gets the previous track in the queue and moves the queue view back."""
+        track = self.queue.previous()
+        self.queueView.advance(-1)
+        self.schedulePrefetch()
+        return self.prefetcher.pop(track)
+
+    def shuffleQueue(self) -> None:
+        """Shuffles the queue and rebuilds the queue view to match."""
+        self.prefetcher.cancel()
+        self.queue.shuffle()
+        self.notifyQueueChanged("shuffle")
+        self.queueView.clear()
+        self.syncQueueView()
+        self.schedulePrefetch()
+
+    def notifyQueueChanged(self, reason: str) -> None:
+        """
+        Marks the queue as changed and dispatches a single queue_change event for the whole change.
+
+        Parameters
+        ----------
+        reason: str
+            What changed the queue.
+        """
+        self.queueVersion += 1
+        if self.client is not None:
+            self.client.dispatch("queue_change", self, reason)
+
+    @staticmethod
+    def trackKey(track: Any) -> Optional[str]:
+        """Gets the URI used to spot duplicate tracks, falling back to the search query for partial tracks."""
+        return getattr(track, "uri", None) or getattr(track, "query", None)
+
+    def _replaceQueue(self, tracks: List[Any], position: int, reason: str) -> None:
+        """
+        Swaps in a rebuilt queue in one go, keeping the current track playing.
+
+        Parameters
+        ----------
+        tracks: List[Any]
+            The new queue.
+        position: int
+            The index of the current track in the new queue. This is worked out by the caller since the same track
+            object can appear more than once.
+        reason: str
+            What changed the queue.
+        """
+        self.prefetcher.cancel()
+        if isinstance(self.queue, lavapy.Queue):
+            self.queue.tracks[:] = tracks
+            self.queue._currentTrack = position
+        else:
+            self.queue.replace(tracks, position)
+        self.queueView.rebuild([self.prefetcher.substitute(track) for track in tracks], position)
+        self.notifyQueueChanged(reason)
+        self.schedulePrefetch()
+
+    def insertAt(self, index: int, result: Union[lavapy.Track, lavapy.PartialResource, lavapy.MultiTrack]) -> int:
+        """
+        Inserts a search result into the queue at a given index.
+
+        Parameters
+        ----------
+        index: int
+            The zero-indexed position to insert at. This must be after the current track.
+        result: Union[lavapy.Track, lavapy.PartialResource, lavapy.MultiTrack]
+            The search result to insert.
+
+        Returns
+        -------
+        int
+            The amount of tracks inserted.
+        """
+        tracks = self.queue.tracks
+        newTracks = result.tracks if isinstance(result, lavapy.MultiTrack) else [result]
+        position = self.queuePosition
+        if index <= position:
+            position += len(newTracks)
+        self._replaceQueue(tracks[:index]+list(newTracks)+tracks[index:], position, "insert")
+        return len(newTracks)
+
+    def removeRange(self, start: int, end: int) -> int:
+        """
+        Removes a range of tracks from the queue.
+
+        Parameters
+        ----------
+        start: int
+            The zero-indexed position of the first track to remove.
+        end: int
+            The zero-indexed position after the last track to remove. The range can't include the current track.
+
+        Returns
+        -------
+        int
+            The amount of tracks removed.
+        """
+        tracks = self.queue.tracks
+        position = self.queuePosition
+        if position >= end:
+            position -= end-start
+        self._replaceQueue(tracks[:start]+tracks[end:], position, "remove")
+        return end-start
+
+    def moveTrack(self, source: int, destination: int) -> None:
+        """
+        Moves a track to another position in the queue.
+
+        Parameters
+        ----------
+        source: int
+            The zero-indexed position of the track to move.
+        destination: int
+            The zero-indexed position the track should end up at.
+        """
+        tracks = list(self.queue.tracks)
+        tracks.insert(destination, tracks.pop(source))
+        position = self.queuePosition
+        if position == source:
+            position = destination
+        elif source < position <= destination:
+            position -= 1
+        elif destination <= position < source:
+            position += 1
+        self._replaceQueue(tracks, position, "move")
+
+    def dedupe(self) -> int:
+        """
+        Removes every track whose URI has already appeared in the queue, always keeping the current track.
+
+        Returns
+        -------
+        int
+            The amount of tracks removed.
+        """
+        tracks = self.queue.tracks
+        current = self.queuePosition
+        seen = {self.trackKey(tracks[current])}
+        uniqueTracks = []
+        position = 0
+        for index, track in enumerate(tracks):
+            key = self.trackKey(track)
+            if index == current:
+                position = len(uniqueTracks)
+                uniqueTracks.append(track)
+            elif key is None or key not in seen:
+                seen.add(key)
+                uniqueTracks.append(track)
+        removed = len(tracks)-len(uniqueTracks)
+        if removed:
+            self._replaceQueue(uniqueTracks, position, "dedupe")
+        return removed
+
+    def truncate(self, keep: int) -> int:
+        """
+        Removes every track after a given amount of upcoming tracks.
+
+        Parameters
+        ----------
+        keep: int
+            How many tracks after the current one to keep.
+
+        Returns
+        -------
+        int
+            The amount of tracks removed.
+        """
+        tracks = self.queue.tracks
+        position = self.queuePosition
+        end = position+1+keep
+        removed = max(0, len(tracks)-end)
+        if removed:
+            self._replaceQueue(tracks[:end], position, "truncate")
+        return removed
+
+    def snapshotState(self, includeQueue: bool) -> Optional[Dict[str, Any]]:
+        """
+        Captures the state needed to resume this player later.
+
+        Parameters
+        ----------
+        includeQueue: bool
+            Whether to include the queue. Leaving it out lets unchanged queues skip being serialized again.
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            The player's state or None if there is nothing to resume.
+        """
+        if self.channel is None:
+            return None
+        state = {"guildId": self.guild.id,
+                 "voiceChannelId": self.channel.id,
+                 "textChannelId": getattr(self.textChannel, "id", None),
+                 "current": self.queuePosition,
+                 "position": self.position,
+                 "volume": self.volume,
+                 "repeating": self.isRepeating}
+        if includeQueue:
+            try:
+                tracks = self.queue.tracks
+            except lavapy.QueueEmpty:
+                return None
+            # Tracks are stored with their encoded IDs so they can be rebuilt without searching again
+            state["queue"] = [TrackStore.serialize(self.prefetcher.substitute(track)) for track in tracks]
+        return state
+
+    async def restoreState(self, state: Dict[str, Any]) -> None:
+        """
+        Resumes a player from a saved state without resolving any tracks again.
+
+        Parameters
+        ----------
+        state: Dict[str, Any]
+            The state saved by :meth:`snapshotState`.
+        """
+        tracks = [TrackStore.deserialize(data) for data in state["queue"] if data is not None]
+        if not tracks:
+            return
+        current = min(state["current"], len(tracks)-1)
+        self.queue.addIterable(tracks)
+        self.queueView.rebuild(tracks, current)
+        self.notifyQueueChanged("restore")
+        if isinstance(self.queue, CompactQueue):
+            track = self.queue.skipTo(current)
+        else:
+            # Point lavapy's queue straight at the saved track. It is no longer -1 so play won't insert the track a second time
+            self.queue._currentTrack = current
+            track = tracks[current]
+        # The position is saved in seconds but lavapy takes the start time in milliseconds
+        await self.play(track, startTime=int(state["position"]*1000))
+        await self.setVolume(state["volume"])
+        if state["repeating"]:
+            self.repeat()
+        self.schedulePrefetch()
+
+    @metrics.lavalinkCall
+    async def play(self, track: Union[lavapy.Track, lavapy.PartialResource, lavapy.MultiTrack], *args, **kwargs) -> None:
+        # Resolve partial tracks here so the search goes through the search cache instead of lavapy's uncached one
+        track = self._multitrackCheck(track)
+        if isinstance(track, lavapy.PartialResource):
+            track = await self.resolvePartial(track)
+            if track is None:
+                return
+        await super().play(track, *args, **kwargs)
+        playerReaper.update(self)
+        playHistory.record(self.guild.id, self.track)
+
+    @metrics.lavalinkCall
+    async def stop(self) -> None:
+        await super().stop()
+        playerReaper.update(self)
+
+    @metrics.lavalinkCall
+    async def pause(self) -> None:
+        await super().pause()
+        playerReaper.update(self)
+
+    @metrics.lavalinkCall
+    async def resume(self) -> None:
+        await super().resume()
+        playerReaper.update(self)
+
+    @metrics.lavalinkCall
+    async def setVolume(self, volume: int) -> None:
+        await super().setVolume(volume)
+
+    @metrics.lavalinkCall
+    async def destroy(self) -> None:
+        self.prefetcher.clear()
+        nodeBalancer.remove(self)
+        playerReaper.remove(self)
+        await playerStateStore.discard(self.guild.id)
+        await super().destroy()
+
+    async def playNext(self) -> None:
+        # Wait for any command changing the player so it doesn't skip a track at the same time
+        async with commandScheduler.serialize(self.guild.id):
+            # Test if the queue is empty
+            if self.queue.isEmpty:
+                # All tracks done so disconnect and cleanup
+                if self.textChannel is not None:
+                    await self.textChannel.send("Finished playing all tracks. Disconnecting")
+                await self.destroy()
+            else:
+                # Play the next track
+                await self.play(self.nextTrack())
+
+
+async def queryAutocomplete(ctx: discord.AutocompleteContext) -> List[discord.OptionChoice]:
+    """Suggests previously played tracks matching what has been typed so far, using their URI so they don't need searching again."""
+    start = time.perf_counter()
+    suggestions = playHistory.suggest(ctx.interaction.guild_id, ctx.value or "")
+    metrics.observe("music_autocomplete_seconds", time.perf_counter()-start)
+    return [discord.OptionChoice(name=label, value=uri) for label, uri in suggestions]
 
 
 # Cog to manage music commands
 class Music(discord.Cog):
+    # Voice states are needed to join channels and to see who is in them
+    requiredIntents = ("voice_states",)
+    memberCache = ("voice",)
+
     def __init__(self, bot) -> None:
         self.bot: BobBot = bot
         self.color = discord.Color.blue()
+        self.trackStore = TrackStore(trackStorePath)
+        self.searchCache = SearchCache(store=self.trackStore)
+        # Saved player states waiting for their guild's shard to be ready
+        self.pendingStates: Dict[int, Dict[str, Any]] = {}
+        persistent_paginators.add_source("queue", self.resolveQueuePages)
 
     async def startup(self):
         """Runs once the bot is up and running."""
         # Wait until the bot is ready
-        await self.bot.wait_until_ready()
-        await lavapy.NodePool.createNode(client=self.bot,
-                                         host="192.168.1.227",
-                                         port=2333,
-                                         password="",
-                                         region=discord.VoiceRegion.london,
-                                         spotifyClient=spotify.SpotifyClient(clientID=Config.spotifyID,
-                                                                             clientSecret=Config.spotifySecret),
-                                         identifier="Main Node")
+        await self.bot.waitUntilShardReady()
+        spotifyClient = spotify.SpotifyClient(clientID=Config.spotifyID, clientSecret=Config.spotifySecret)
+        nodes = await asyncio.gather(*[lavapy.NodePool.createNode(client=self.bot,
+                                                                  host=node["host"],
+                                                                  port=node["port"],
+                                                                  password=node["password"],
+                                                                  region=discord.VoiceRegion[node["region"]],
+                                                                  spotifyClient=spotifyClient,
+                                                                  identifier=node["identifier"]) for node in lavalinkNodes])
+        for node in nodes:
+            nodeBalancer.addNode(node)
+        nodeBalancer.start()
+        metrics.gauge("music_players", lambda: len(nodeBalancer.players))
+        metrics.gauge("music_queued_tracks", lambda: sum(len(player.queueView) for player in nodeBalancer.players.values()))
+        metrics.gauge("search_cache_hits", lambda: self.searchCache.hits)
+        metrics.gauge("search_cache_misses", lambda: self.searchCache.misses)
+        metrics.gauge("paginators_live", lambda: len(paginatorRegistry))
+        metrics.gauge("music_command_queue_depth_max", lambda: commandScheduler.maxDepth)
+        metrics.gauge("music_command_queue_depth_total", lambda: commandScheduler.totalDepth)
+        metrics.gauge("music_players_reap_pending", lambda: len(playerReaper))
+        metrics.gauge("music_play_history_entries", lambda: len(playHistory.globalIndex))
+        playerReaper.start(self.reapPlayer)
+        # Resume any players which were running before the restart
+        await playerStateStore.open()
+        self.pendingStates.update((state["guildId"], state) for state in await playerStateStore.load())
+        await self.resumePending()
+        playerStateStore.start(lambda: nodeBalancer.players.values())
+        # Preload the most popular search results so they don't need to be resolved again
+        await self.trackStore.open()
+        for key, result in reversed(await self.trackStore.hottest(self.searchCache.maxSize)):
+            self.searchCache.put(key, result)
+
+    def cog_unload(self) -> None:
+        # Write any pending search results and player states before the cog goes away
+        self.bot.loop.create_task(self.trackStore.close())
+        self.bot.loop.create_task(playerStateStore.close(list(nodeBalancer.players.values())))
+
+    async def shardStartup(self, shardId: int) -> None:
+        """Runs when a shard becomes ready after the first one."""
+        await self.resumePending(shardId)
+
+    async def resumePending(self, shardId: Optional[int] = None) -> None:
+        """
+        Resumes the saved players whose guilds are on a shard which is ready.
+
+        Parameters
+        ----------
+        shardId: Optional[int]
+            Only resumes players on this shard if given.
+        """
+        for guildId, state in list(self.pendingStates.items()):
+            # The guild may be handled by a shard running in another process or by one which isn't ready yet
+            guild = self.bot.get_guild(guildId)
+            if guild is None or (shardId is not None and guild.shard_id != shardId):
+                continue
+            shardReady = self.bot.shardEvents.get(guild.shard_id)
+            if shardReady is None or not shardReady.is_set():
+                continue
+            del self.pendingStates[guildId]
+            await self.resumePlayer(state)
+
+    async def resumePlayer(self, state: Dict[str, Any]) -> None:
+        """Reconnects and resumes a player from its saved state."""
+        # The guild may be handled by a shard running in another process
+        if self.bot.get_guild(state["guildId"]) is None:
+            return
+        channel = self.bot.get_channel(state["voiceChannelId"])
+        if not isinstance(channel, discord.VoiceChannel):
+            await playerStateStore.discard(state["guildId"])
+            return
+        # noinspection PyTypeChecker
+        player: CustomPlayer = await channel.connect(cls=CustomPlayer)
+        player.searchCache = self.searchCache
+        player.textChannel = self.bot.get_channel(state["textChannelId"]) if state["textChannelId"] else None
+        await player.restoreState(state)
+
+    def queuePages(self, player: CustomPlayer) -> PageSource:
+        """
+        Gets the pages for a player's queue, sharing them with any other paginator showing the same queue.
+
+        Parameters
+        ----------
+        player: CustomPlayer
+            The player whose queue should be shown.
+
+        Returns
+        -------
+        PageSource
+            The source which renders the queue's pages.
+        """
+        queueView = player.queueView
+
+        def renderPage(count: int) -> discord.Embed:
+            # The queue may have shrunk since the paginator was created so the page is worked out from the live queue
+            count = queueView.clampPage(count)
+            tempEmbed = discord.Embed(title=f"Page {count+1} of {max(queueView.pageCount, 1)}", colour=self.color)
+            tempEmbed.set_footer(text=f"Track Total: {len(queueView)}")
+            tempEmbed.description = queueView.renderPage(count)
+            return tempEmbed
+
+        return paginatorRegistry.source((player.guild.id, queueView.revision), lambda: PageSource(queueView.pageCount, renderPage))
+
+    def resolveQueuePages(self, key: str) -> Optional[Tuple[str, PageSource]]:
+        """Finds the current queue pages for a persistent paginator whose key is 'guild ID.queue revision'."""
+        player = nodeBalancer.players.get(int(key.split(".")[0]))
+        if player is None:
+            return None
+        player.syncQueueView()
+        if not len(player.queueView):
+            return None
+        return f"{player.guild.id}.{player.queueView.revision}", self.queuePages(player)
+
+    async def reapPlayer(self, player: CustomPlayer, reason: str) -> None:
+        """
+        Disconnects a player which has been unused for too long, saving its queue first if enabled.
+
+        Parameters
+        ----------
+        player: CustomPlayer
+            The player to disconnect.
+        reason: str
+            Why the player is being disconnected. This is either 'idle', 'paused' or 'alone'.
+        """
+        async with commandScheduler.serialize(player.guild.id):
+            # The player may have been disconnected while waiting
+            if nodeBalancer.players.get(player.guild.id) is not player:
+                return
+            saved = False
+            if reaperSnapshots:
+                state = player.snapshotState(True)
+                if state is not None:
+                    await playerStateStore.saveReaped(state)
+                    saved = True
+            if player.textChannel is not None:
+                messages = {"idle": "nothing has been playing", "paused": "being paused", "alone": "being alone in the channel"}
+                await player.textChannel.send(f"Disconnecting after {messages[reason]} for a while." + (" Use /restore to bring the queue back" if saved else ""))
+            await player.destroy()
+
+    @discord.Cog.listener()
+    async def on_voice_state_update(self,
+                                    member: discord.Member,
+                                    before: discord.VoiceState,
+                                    after: discord.VoiceState
+                                    ) -> None:
+        # Start or stop the alone timer when someone joins or leaves a channel with a player in it
+        if before.channel == after.channel:
+            return
+        player = nodeBalancer.players.get(member.guild.id)
+        if player is not None and player.channel in (before.channel, after.channel):
+            playerReaper.update(player)
+
+    @discord.Cog.listener()
+    async def on_lavapy_track_end(self, player: CustomPlayer, track: lavapy.Track, reason: str) -> None:
+        # Lavapy clears the player's track before dispatching this so the player may have just become idle
+        if isinstance(player, CustomPlayer):
+            playerReaper.update(player)
 
     @staticmethod
     def listSplit(arr: List[Any], perListSize: int) -> List[List[Any]]:
@@ -72,8 +829,22 @@ class Music(discord.Cog):
             result.append(arr[i * perListSize:i * perListSize + perListSize])
         return result
 
-    @staticmethod
-    async def joinChannel(ctx: discord.ApplicationContext,
+    async def searchQuery(self, query: str) -> Optional[Union[lavapy.Track, lavapy.PartialResource, lavapy.MultiTrack]]:
+        """Finds out what track type a query is for and then searches it through the search cache."""
+        # Suggestions from autocomplete are the URI of a track which has already been played
+        track = playHistory.knownTrack(query)
+        if track is not None:
+            metrics.increment("music_autocomplete_hits_total")
+            return track
+        if "spotify.com" in query:
+            searchType = spotify.decodeSpotifyQuery(query)
+        else:
+            searchType = lavapy.decodeQuery(query)
+        with metrics.phase("lavalink"):
+            return await self.searchCache.search(searchType, query, partial=True)
+
+    async def joinChannel(self,
+                          ctx: discord.ApplicationContext,
                           channel: discord.VoiceChannel = None
                           ) -> None:
         """Joins a voice channel."""
@@ -86,9 +857,13 @@ class Music(discord.Cog):
         # noinspection PyTypeChecker
         player: CustomPlayer = await channel.connect(cls=CustomPlayer)
         player.context = ctx
+        player.textChannel = ctx.channel
+        player.searchCache = self.searchCache
+        playerReaper.update(player)
         await ctx.respond(f"Joined the voice channel {channel.mention}")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def connect(self,
                       ctx: discord.ApplicationContext,
                       channel: discord.Option(discord.VoiceChannel, "The voice channel to connect to", required=False)
@@ -96,7 +871,8 @@ class Music(discord.Cog):
         """Connects the bot to a given voice channel or to the one the user is currently connected to."""
         await self.joinChannel(ctx, channel)
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def disconnect(self,
                          ctx: discord.ApplicationContext
                          ) -> None:
@@ -109,38 +885,67 @@ class Music(discord.Cog):
         await player.destroy()
         await ctx.respond("Player has left the channel.")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
     async def play(self,
                    ctx: discord.ApplicationContext,
-                   query: discord.Option(str, "The query to search for. This could be a search query or a URL")
+                   query: discord.Option(str, "The query to search for. This could be a search query or a URL", autocomplete=queryAutocomplete)
                    ) -> None:
         """Searches for and plays a given search query or URL."""
         if not ctx.voice_client:
             # Bot not in voice channel
-            await self.joinChannel(ctx)
+            async with commandScheduler.serialize(ctx.guild_id):
+                if not ctx.voice_client:
+                    await self.joinChannel(ctx)
         player: CustomPlayer = ctx.voice_client
         if not player:
             # Bot couldn't join channel since the user wasn't connected
             return
-        # Find out what track type it is and then search it
-        if "spotify.com" in query:
-            searchType = spotify.decodeSpotifyQuery(query)
-        else:
-            searchType = lavapy.decodeQuery(query)
-        result = await searchType.search(query, partial=True)
+        result = await self.searchQuery(query)
         if result is None:
-            await ctx.respond("No results were found for that search")
+            with metrics.phase("discord"):
+                await ctx.respond("No results were found for that search")
             return
-        # If the player is already playing, push result to the queue
+        # If the player is already playing, push result to the queue along with any other results which arrive while waiting
         if player.isPlaying:
-            if isinstance(result, lavapy.MultiTrack):
-                player.queue.addIterable(result.tracks)
+            await commandScheduler.coalesce(ctx.guild_id, result, player.enqueueMany)
+            return
+        async with commandScheduler.serialize(ctx.guild_id):
+            # Another command may have started playing while this one was waiting
+            if player.isPlaying:
+                player.enqueue(result)
             else:
-                player.queue.add(result)
+                await player.playResult(result)
+
+    @discord.slash_command()
+    async def playnext(self,
+                       ctx: discord.ApplicationContext,
+                       query: discord.Option(str, "The query to search for. This could be a search query or a URL")
+                       ) -> None:
+        """Searches for a given search query or URL and plays it after the current track."""
+        if not ctx.voice_client:
+            # Bot not in voice channel
+            async with commandScheduler.serialize(ctx.guild_id):
+                if not ctx.voice_client:
+                    await self.joinChannel(ctx)
+        player: CustomPlayer = ctx.voice_client
+        if not player:
+            # Bot couldn't join channel since the user wasn't connected
             return
-        await player.play(result)
+        result = await self.searchQuery(query)
+        if result is None:
+            with metrics.phase("discord"):
+                await ctx.respond("No results were found for that search")
+            return
+        async with commandScheduler.serialize(ctx.guild_id):
+            if not player.isPlaying:
+                await player.playResult(result)
+                return
+            player.syncQueueView()
+            count = player.insertAt(player.queuePosition+1, result)
+        await ctx.respond(f"Playing {count} track(s) next")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def pause(self,
                     ctx: discord.ApplicationContext
                     ) -> None:
@@ -155,7 +960,8 @@ class Music(discord.Cog):
         await player.pause()
         await ctx.respond("Bot has been paused")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def resume(self,
                      ctx: discord.ApplicationContext
                      ) -> None:
@@ -170,7 +976,8 @@ class Music(discord.Cog):
         await player.resume()
         await ctx.respond("Bot has been resumed")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def stop(self,
                    ctx: discord.ApplicationContext
                    ) -> None:
@@ -185,7 +992,8 @@ class Music(discord.Cog):
         await player.stop()
         await ctx.respond("Bot has been stopped")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def next(self,
                    ctx: discord.ApplicationContext
                    ) -> None:
@@ -195,7 +1003,7 @@ class Music(discord.Cog):
             return
         player: CustomPlayer = ctx.voice_client
         try:
-            track = player.queue.next()
+            track = player.nextTrack()
         except lavapy.QueueEmpty:
             await ctx.respond("Queue is empty.")
             return
@@ -205,7 +1013,8 @@ class Music(discord.Cog):
         await player.play(track)
         await ctx.respond(f"Now playing {player.track.title}")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def previous(self,
                        ctx: discord.ApplicationContext
                        ) -> None:
@@ -215,7 +1024,7 @@ class Music(discord.Cog):
             return
         player: CustomPlayer = ctx.voice_client
         try:
-            track = player.queue.previous()
+            track = player.previousTrack()
         except lavapy.QueueEmpty:
             await ctx.respond("Queue is empty")
             return
@@ -225,7 +1034,7 @@ class Music(discord.Cog):
         await player.play(track)
         await ctx.respond(f"Now playing {player.track.title}")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
     async def queue(self,
                     ctx: discord.ApplicationContext
                     ) -> None:
@@ -234,34 +1043,23 @@ class Music(discord.Cog):
             await ctx.respond("Bot is not connected to voice")
             return
         player: CustomPlayer = ctx.voice_client
-        try:
-            tracks = player.queue.tracks
-        except lavapy.QueueEmpty:
+        player.syncQueueView()
+        queueView = player.queueView
+        if not len(queueView):
             await ctx.respond("Queue is empty.")
             return
-        # Split up tracks into sublists of 20 tracks each
-        pages = []
-        splittedTracks = self.listSplit(tracks, 20)
-        for count, sublist in enumerate(splittedTracks):
-            tempEmbed = discord.Embed(title=f"Page {count+1} of {len(splittedTracks)}", colour=self.color)
-            tempEmbed.set_footer(text=f"Track Total: {len(tracks)}")
-            tempDescription = ""
-            for position, track in enumerate(sublist):
-                # Display currently playing track
-                if track == player.track:
-                    tempDescription += "► "
-                # Display the track position and query ('track - author name' for full tracks)
-                if isinstance(track, lavapy.Track):
-                    tempDescription += f"{(count*20)+position+1}. {track.title} - {track.author}\n"
-                elif isinstance(track, lavapy.PartialResource):
-                    tempDescription += f"{(count*20)+position+1}. {track.query} (Partial)\n"
-            tempEmbed.description = tempDescription
-            pages.append(tempEmbed)
+
         # Paginate the response
-        paginator = Paginator(pages)
-        await paginator.respond(ctx.interaction)
+        if persistentQueuePages:
+            with metrics.phase("discord"):
+                await persistent_paginators.respond(ctx.interaction, "queue", str(ctx.guild_id))
+            return
+        paginator = Paginator(self.queuePages(player), timeout=paginatorLimits["timeout"], registry=paginatorRegistry)
+        with metrics.phase("discord"):
+            await paginator.respond(ctx.interaction)
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def repeat(self,
                      ctx: discord.ApplicationContext
                      ) -> None:
@@ -278,7 +1076,8 @@ class Music(discord.Cog):
             player.repeat()
             await ctx.respond("Repeating the current track")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def shuffle(self,
                       ctx: discord.ApplicationContext
                       ) -> None:
@@ -287,10 +1086,93 @@ class Music(discord.Cog):
             await ctx.respond("Bot is not connected to voice")
             return
         player: CustomPlayer = ctx.voice_client
-        player.queue.shuffle()
+        player.shuffleQueue()
         await ctx.respond("Shuffled the queue")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
+    @commandScheduler.serialized
+    async def remove(self,
+                     ctx: discord.ApplicationContext,
+                     start: discord.Option(int, "The position of the first track to remove", min_value=1),
+                     end: discord.Option(int, "The position of the last track to remove", min_value=1, required=False)
+                     ) -> None:
+        """Removes a track or a range of tracks from the queue."""
+        if not ctx.voice_client:
+            await ctx.respond("Bot is not connected to voice")
+            return
+        player: CustomPlayer = ctx.voice_client
+        player.syncQueueView()
+        end = end or start
+        if end < start or end > len(player.queueView):
+            await ctx.respond("Those positions are not in the queue")
+            return
+        if start-1 <= player.queuePosition < end:
+            await ctx.respond("Cannot remove the currently playing track")
+            return
+        removed = player.removeRange(start-1, end)
+        await ctx.respond(f"Removed {removed} track(s) from the queue")
+
+    @discord.slash_command()
+    @commandScheduler.serialized
+    async def move(self,
+                   ctx: discord.ApplicationContext,
+                   source: discord.Option(int, "The position of the track to move", min_value=1),
+                   destination: discord.Option(int, "The position to move the track to", min_value=1)
+                   ) -> None:
+        """Moves a track to another position in the queue."""
+        if not ctx.voice_client:
+            await ctx.respond("Bot is not connected to voice")
+            return
+        player: CustomPlayer = ctx.voice_client
+        player.syncQueueView()
+        if max(source, destination) > len(player.queueView):
+            await ctx.respond("Those positions are not in the queue")
+            return
+        player.moveTrack(source-1, destination-1)
+        await ctx.respond(f"Moved track {source} to position {destination}")
+
+    @discord.slash_command()
+    @commandScheduler.serialized
+    async def dedupe(self,
+                     ctx: discord.ApplicationContext
+                     ) -> None:
+        """Removes every duplicate track from the queue."""
+        if not ctx.voice_client:
+            await ctx.respond("Bot is not connected to voice")
+            return
+        player: CustomPlayer = ctx.voice_client
+        player.syncQueueView()
+        if not len(player.queueView):
+            await ctx.respond("Queue is empty.")
+            return
+        removed = player.dedupe()
+        await ctx.respond(f"Removed {removed} duplicate track(s) from the queue")
+
+    @discord.slash_command()
+    @commandScheduler.serialized
+    async def restore(self,
+                      ctx: discord.ApplicationContext
+                      ) -> None:
+        """Brings back the queue which was saved when the bot last left for being unused."""
+        if not ctx.voice_client:
+            await self.joinChannel(ctx)
+        player: CustomPlayer = ctx.voice_client
+        if not player:
+            # Bot couldn't join channel since the user wasn't connected
+            return
+        player.syncQueueView()
+        if len(player.queueView):
+            await ctx.respond("Cannot restore a saved queue while there is already a queue")
+            return
+        state = await playerStateStore.popReaped(ctx.guild_id)
+        if state is None:
+            await ctx.respond("There is no saved queue to restore")
+            return
+        await player.restoreState(state)
+        await ctx.respond("Restored the saved queue")
+
+    @discord.slash_command()
+    @commandScheduler.serialized
     async def volume(self,
                      ctx: discord.ApplicationContext,
                      volume: discord.Option(int, "The volume to set the bot to", min_value=0, max_value=1000)
@@ -303,7 +1185,7 @@ class Music(discord.Cog):
         await player.setVolume(volume)
         await ctx.respond(f"Set bot volume to {volume}")
 
-    @discord.slash_command(guild_ids=[682249251543449601])
+    @discord.slash_command()
     async def current(self,
                       ctx: discord.ApplicationContext
                       ) -> None:
@@ -0,0 +1,45 @@
+# Builtin
+from typing import TYPE_CHECKING
+# Pip
+import discord
+# Custom
+from Utils.Metrics import metrics
+
+if TYPE_CHECKING:
+    from BobBot import BobBot
+
+
+# Cog to expose the bot's performance metrics
+class Stats(discord.Cog):
+    def __init__(self, bot) -> None:
+        self.bot: BobBot = bot
+        self.color = discord.Color.purple()
+
+    async def startup(self):
+        """Runs once the bot is up and running."""
+        pass
+
+    @discord.slash_command()
+    async def stats(self,
+                    ctx: discord.ApplicationContext
+                    ) -> None:
+        """Displays the bot's performance metrics. Only the bot owner can use this."""
+        if not await self.bot.is_owner(ctx.author):
+            await ctx.respond("Only the bot owner can use this command", ephemeral=True)
+            return
+        snapshot = metrics.snapshot()
+        statsEmbed = discord.Embed(title="Bot Stats", colour=self.color)
+        statsEmbed.add_field(name="Gauges", value="\n".join(f"{name}: {value:.4g}" for name, value in snapshot["gauges"].items()) or "None", inline=False)
+        commandLines = [f"{name}: n={histogram['count']} p50<={histogram['p50']}s p99<={histogram['p99']}s"
+                        for name, histogram in snapshot["histograms"].items() if name.startswith("command_latency_seconds")]
+        statsEmbed.add_field(name="Command Latency", value="\n".join(commandLines)[:1024] or "None", inline=False)
+        lavalinkLines = [f"{name}: {value:g}" for name, value in snapshot["counters"].items() if name.startswith("lavalink_requests_total")]
+        statsEmbed.add_field(name="Lavalink Requests", value="\n".join(lavalinkLines)[:1024] or "None", inline=False)
+        lagHistogram = snapshot["histograms"].get("event_loop_lag_seconds")
+        if lagHistogram is not None:
+            statsEmbed.add_field(name="Event Loop Lag", value=f"p50<={lagHistogram['p50']}s p99<={lagHistogram['p99']}s", inline=False)
+        await ctx.respond(embed=statsEmbed, ephemeral=True)
+
+
+def setup(bot) -> None:
+    bot.add_cog(Stats(bot))
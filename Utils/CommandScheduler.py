@@ -0,0 +1,95 @@
+# Builtin
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+# Pip
+import discord
+# Custom
+from Utils.Metrics import metrics
+
+
+# Runs commands which change the same guild's player one at a time while different guilds run in parallel
+class CommandScheduler:
+    def __init__(self) -> None:
+        self.depths: Dict[Optional[int], int] = {}
+        self._locks: Dict[Optional[int], asyncio.Lock] = {}
+        self._batches: Dict[Optional[int], Tuple[List[Any], asyncio.Future]] = {}
+
+    @property
+    def maxDepth(self) -> int:
+        """The amount of commands running or waiting in the busiest guild."""
+        return max(self.depths.values(), default=0)
+
+    @property
+    def totalDepth(self) -> int:
+        """The amount of commands running or waiting across every guild."""
+        return sum(self.depths.values())
+
+    @asynccontextmanager
+    async def serialize(self, guildId: Optional[int]) -> AsyncIterator[None]:
+        """
+        Waits until no other command is changing a guild's player and holds it until the block finishes.
+
+        Parameters
+        ----------
+        guildId: Optional[int]
+            The ID of the guild whose player is being changed.
+        """
+        lock = self._locks.get(guildId)
+        if lock is None:
+            lock = self._locks[guildId] = asyncio.Lock()
+        self.depths[guildId] = self.depths.get(guildId, 0)+1
+        metrics.observe("music_command_queue_depth", self.depths[guildId])
+        try:
+            async with lock:
+                yield
+        finally:
+            self.depths[guildId] -= 1
+            # Drop idle guilds so the scheduler doesn't grow with every guild the bot has ever been used in
+            if not self.depths[guildId]:
+                del self.depths[guildId]
+                del self._locks[guildId]
+
+    async def coalesce(self, guildId: Optional[int], item: Any, flush: Callable[[List[Any]], None]) -> None:
+        """
+        Adds an item to a batch which is flushed in one go once the guild's player is free.
+
+        Items which arrive while a batch is waiting join it instead of each waiting for their own turn.
+
+        Parameters
+        ----------
+        guildId: Optional[int]
+            The ID of the guild whose player is being changed.
+        item: Any
+            The item to add to the batch.
+        flush: Callable[[List[Any]], None]
+            Applies a whole batch of items.
+        """
+        batch = self._batches.get(guildId)
+        if batch is not None:
+            batch[0].append(item)
+            await asyncio.shield(batch[1])
+            return
+        batch = self._batches[guildId] = ([item], asyncio.get_running_loop().create_future())
+        items, done = batch
+        try:
+            async with self.serialize(guildId):
+                # Anything arriving from now on has to wait for the next batch
+                del self._batches[guildId]
+                flush(items)
+        finally:
+            if self._batches.get(guildId) is batch:
+                del self._batches[guildId]
+            done.set_result(None)
+
+    def serialized(self, func: Callable) -> Callable:
+        """Decorates a cog command so it runs one at a time with the other serialized commands in the same guild."""
+        @functools.wraps(func)
+        async def wrapper(cog: discord.Cog, ctx: discord.ApplicationContext, *args, **kwargs):
+            # Acknowledge the interaction first if the command has to wait so Discord doesn't time it out
+            if self.depths.get(ctx.guild_id) and not ctx.interaction.response.is_done():
+                await ctx.defer()
+            async with self.serialize(ctx.guild_id):
+                return await func(cog, ctx, *args, **kwargs)
+        return wrapper
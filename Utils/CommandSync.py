@@ -0,0 +1,162 @@
+# Builtin
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Tuple
+# Pip
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+# Registers application commands by only sending what changed since the last sync
+class CommandSync:
+    def __init__(self, http: Any, manifestPath: Path) -> None:
+        self.http = http
+        self.manifestPath = manifestPath
+        try:
+            self.manifest: Dict[str, Dict[str, Dict[str, Any]]] = json.loads(self.manifestPath.read_text())
+        except (OSError, ValueError):
+            self.manifest = {}
+        # Every shard connecting runs a sync and they all share the manifest so only one can run at a time
+        self._lock = asyncio.Lock()
+
+    def _saveManifest(self) -> None:
+        """Writes the registered commands manifest to disk."""
+        self.manifestPath.parent.mkdir(parents=True, exist_ok=True)
+        self.manifestPath.write_text(json.dumps(self.manifest, indent=4))
+
+    @staticmethod
+    def hashPayload(payload: Dict[str, Any]) -> str:
+        """Hashes a command payload so changes can be spotted without storing the whole definition."""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+    @staticmethod
+    def scopeKey(guildId: Optional[int]) -> str:
+        """Gets the manifest key for a scope."""
+        return "global" if guildId is None else str(guildId)
+
+    def registeredId(self, guildId: Optional[int], name: str) -> Optional[int]:
+        """Gets the ID a command was registered with in a scope according to the manifest."""
+        entry = self.manifest.get(self.scopeKey(guildId), {}).get(name)
+        return entry["id"] if entry is not None else None
+
+    async def _fetch(self, applicationId: int, guildId: Optional[int]) -> List[Dict[str, Any]]:
+        if guildId is None:
+            return await self.http.get_global_commands(applicationId)
+        return await self.http.get_guild_commands(applicationId, guildId)
+
+    async def _create(self, applicationId: int, guildId: Optional[int], payload: Dict[str, Any]) -> Dict[str, Any]:
+        if guildId is None:
+            return await self.http.upsert_global_command(applicationId, payload)
+        return await self.http.upsert_guild_command(applicationId, guildId, payload)
+
+    async def _update(self, applicationId: int, guildId: Optional[int], commandId: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if guildId is None:
+            return await self.http.edit_global_command(applicationId, commandId, payload)
+        return await self.http.edit_guild_command(applicationId, guildId, commandId, payload)
+
+    async def _delete(self, applicationId: int, guildId: Optional[int], commandId: int) -> None:
+        if guildId is None:
+            await self.http.delete_global_command(applicationId, commandId)
+        else:
+            await self.http.delete_guild_command(applicationId, guildId, commandId)
+
+    def diff(self, guildId: Optional[int], payloads: Dict[str, Dict[str, Any]], keep: Collection[str] = ()) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compares the local commands in a scope against the manifest.
+
+        Parameters
+        ----------
+        guildId: Optional[int]
+            The guild the commands are registered in or None for global commands.
+        payloads: Dict[str, Dict[str, Any]]
+            The local command payloads keyed by their name.
+        keep: Collection[str]
+            The names of commands which aren't loaded yet and so shouldn't be deleted.
+
+        Returns
+        -------
+        Tuple[List[str], List[str], List[str]]
+            The names of the commands to create, update and delete.
+        """
+        registered = self.manifest.get(self.scopeKey(guildId), {})
+        creates = [name for name in payloads if name not in registered]
+        updates = [name for name, payload in payloads.items() if name in registered and registered[name]["hash"] != self.hashPayload(payload)]
+        deletes = [name for name in registered if name not in payloads and name not in keep]
+        return creates, updates, deletes
+
+    async def syncScope(self, applicationId: int, guildId: Optional[int], payloads: Dict[str, Dict[str, Any]], keep: Collection[str] = ()) -> Dict[str, Any]:
+        """
+        Brings the commands registered in a scope in line with the local commands.
+
+        Parameters
+        ----------
+        applicationId: int
+            The bot's application ID.
+        guildId: Optional[int]
+            The guild to sync or None for global commands.
+        payloads: Dict[str, Dict[str, Any]]
+            The local command payloads keyed by their name.
+        keep: Collection[str]
+            The names of commands which aren't loaded yet and so shouldn't be deleted.
+
+        Returns
+        -------
+        Dict[str, Any]
+            How many commands were created, updated and deleted and the ID of every registered command.
+        """
+        key = self.scopeKey(guildId)
+        if key not in self.manifest:
+            # Nothing is known about this scope so start from what Discord has. Hashes are unknown so every matching command is updated once
+            self.manifest[key] = {command["name"]: {"id": int(command["id"]), "hash": None} for command in await self._fetch(applicationId, guildId)}
+        registered = self.manifest[key]
+        creates, updates, deletes = self.diff(guildId, payloads, keep)
+        for name in creates+updates:
+            payload = payloads[name]
+            if name in registered:
+                command = await self._update(applicationId, guildId, registered[name]["id"], payload)
+            else:
+                command = await self._create(applicationId, guildId, payload)
+            registered[name] = {"id": int(command["id"]), "hash": self.hashPayload(payload)}
+        for name in deletes:
+            await self._delete(applicationId, guildId, registered.pop(name)["id"])
+        if not registered:
+            del self.manifest[key]
+        if creates or updates or deletes:
+            self._saveManifest()
+        return {"created": len(creates), "updated": len(updates), "deleted": len(deletes), "ids": {name: entry["id"] for name, entry in registered.items()}}
+
+    async def sync(self, applicationId: int, scopes: Dict[Optional[int], Dict[str, Dict[str, Any]]], keep: Collection[str] = ()) -> Dict[str, Dict[str, Any]]:
+        """
+        Syncs every scope, including ones in the manifest which no longer have any local commands.
+
+        Parameters
+        ----------
+        applicationId: int
+            The bot's application ID.
+        scopes: Dict[Optional[int], Dict[str, Dict[str, Any]]]
+            The local command payloads keyed by their guild (None for global) and then by their name.
+        keep: Collection[str]
+            The names of commands which aren't loaded yet and so shouldn't be deleted.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            The result of syncing each scope.
+        """
+        async with self._lock:
+            scopes = dict(scopes)
+            for key in list(self.manifest):
+                guildId = None if key == "global" else int(key)
+                scopes.setdefault(guildId, {})
+            results = {}
+            for guildId, payloads in scopes.items():
+                try:
+                    results[self.scopeKey(guildId)] = await self.syncScope(applicationId, guildId, payloads, keep)
+                except discord.Forbidden:
+                    # The bot may have been removed from a guild or lost the applications.commands scope there
+                    logger.warning(f"Missing access to sync commands in {self.scopeKey(guildId)}")
+            return results
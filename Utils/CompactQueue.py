@@ -0,0 +1,136 @@
+# Builtin
+import random
+import sys
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional, Union
+# Pip
+import lavapy
+
+if TYPE_CHECKING:
+    from Cogs.Music import CustomPlayer
+
+
+# Minimal queue entry which only keeps what is needed to display and rebuild a track
+class CompactTrack:
+    __slots__ = ("id", "identifier", "title", "author", "length", "uri", "sourceName", "isSeekable", "isStream", "trackClass")
+
+    def __init__(self, track: lavapy.Track) -> None:
+        self.id: str = track.id
+        self.identifier: str = track.identifier
+        self.title: str = sys.intern(track.title)
+        self.author: str = sys.intern(track.author)
+        self.length: int = track.length
+        self.uri: Optional[str] = track.uri
+        self.sourceName: str = sys.intern(track.type)
+        self.isSeekable: bool = track.isSeekable
+        self.isStream: bool = track.isStream
+        self.trackClass: type = type(track)
+
+    def __eq__(self, other: Any) -> bool:
+        return self.id == getattr(other, "id", None)
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def materialize(self) -> lavapy.Track:
+        """Rebuilds the full lavapy track."""
+        return self.trackClass(self.id, {"identifier": self.identifier,
+                                         "isSeekable": self.isSeekable,
+                                         "author": self.author,
+                                         "length": self.length,
+                                         "isStream": self.isStream,
+                                         "position": 0,
+                                         "sourceName": self.sourceName,
+                                         "title": self.title,
+                                         "uri": self.uri})
+
+
+# Drop-in replacement for lavapy's queue which stores compact entries instead of full tracks
+class CompactQueue:
+    def __init__(self, player: "CustomPlayer") -> None:
+        self.player = player
+        self._entries: List[Union[CompactTrack, lavapy.PartialResource]] = []
+        self._position = 0
+        self._current: Optional[Union[lavapy.Track, lavapy.PartialResource]] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def compact(track: Union[lavapy.Track, lavapy.PartialResource]) -> Union[CompactTrack, lavapy.PartialResource]:
+        """Converts a track into its compact form. Partial tracks are already small so they are kept as they are."""
+        return track if isinstance(track, (lavapy.PartialResource, CompactTrack)) else CompactTrack(track)
+
+    def _materialize(self, index: int) -> Union[lavapy.Track, lavapy.PartialResource]:
+        """Gets the full track at a given index, caching it while it is the current track."""
+        entry = self._entries[index]
+        self._current = entry.materialize() if isinstance(entry, CompactTrack) else entry
+        return self._current
+
+    @property
+    def tracks(self) -> List[Union[CompactTrack, lavapy.PartialResource]]:
+        """The compact entries in the queue."""
+        if not self._entries:
+            raise lavapy.QueueEmpty
+        return self._entries
+
+    @property
+    def position(self) -> int:
+        """The index of the current track."""
+        return self._position
+
+    @property
+    def isEmpty(self) -> bool:
+        """Whether there are no more tracks after the current one."""
+        return self._position >= len(self._entries)-1
+
+    @property
+    def currentTrack(self) -> Optional[Union[lavapy.Track, lavapy.PartialResource]]:
+        """The full version of the current track."""
+        if self._current is None and self._entries:
+            return self._materialize(self._position)
+        return self._current
+
+    def add(self, track: Union[lavapy.Track, lavapy.PartialResource]) -> None:
+        """Adds a track to the end of the queue."""
+        self._entries.append(self.compact(track))
+
+    def addIterable(self, tracks: Iterable[Union[lavapy.Track, lavapy.PartialResource]]) -> None:
+        """Adds multiple tracks to the end of the queue."""
+        self._entries.extend(self.compact(track) for track in tracks)
+
+    def next(self) -> Union[lavapy.Track, lavapy.PartialResource]:
+        """Moves to and returns the next track."""
+        # Checked in the same order as lavapy's queue so the end of the queue wins over repeating
+        if self.isEmpty:
+            raise lavapy.QueueEmpty
+        if self.player.isRepeating:
+            raise lavapy.RepeatException
+        self._position += 1
+        return self._materialize(self._position)
+
+    def previous(self) -> Union[lavapy.Track, lavapy.PartialResource]:
+        """Moves to and returns the previous track."""
+        if self._position <= 0:
+            raise lavapy.QueueEmpty
+        if self.player.isRepeating:
+            raise lavapy.RepeatException
+        self._position -= 1
+        return self._materialize(self._position)
+
+    def skipTo(self, index: int) -> Union[lavapy.Track, lavapy.PartialResource]:
+        """Moves to and returns the track at a given index."""
+        if not 0 <= index < len(self._entries):
+            raise lavapy.QueueEmpty
+        self._position = index
+        return self._materialize(index)
+
+    def replace(self, tracks: Iterable[Union[lavapy.Track, lavapy.PartialResource, CompactTrack]], position: int) -> None:
+        """Replaces every track in the queue at once. The current track must still be at the given position."""
+        self._entries = [self.compact(track) for track in tracks]
+        self._position = position
+
+    def shuffle(self) -> None:
+        """Shuffles the queue but keeps the current track in the same place, the same as lavapy's queue."""
+        current = self._entries.pop(self._position)
+        random.shuffle(self._entries)
+        self._entries.insert(self._position, current)
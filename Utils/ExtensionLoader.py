@@ -0,0 +1,163 @@
+# Builtin
+import asyncio
+import builtins
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+# Pip
+import discord
+# Custom
+from Utils.LeanGateway import cogRequirements, mergeRequirements
+
+logger = logging.getLogger(__name__)
+
+
+# Times every module imported inside the block. Times are cumulative so they include any nested imports
+@contextmanager
+def profileImports(importTimes: Dict[str, float]) -> Iterator[None]:
+    originalImport = builtins.__import__
+
+    def timedImport(name, *args, **kwargs):
+        if name in sys.modules:
+            return originalImport(name, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return originalImport(name, *args, **kwargs)
+        finally:
+            importTimes.setdefault(name, time.perf_counter()-start)
+
+    builtins.__import__ = timedImport
+    try:
+        yield
+    finally:
+        builtins.__import__ = originalImport
+
+
+# Loads extensions either straight away or lazily on first use using a cached manifest of their commands and gateway requirements
+class ExtensionLoader:
+    def __init__(self, bot: discord.Bot, manifestPath: Path, profile: bool = False) -> None:
+        self.bot = bot
+        self.manifestPath = manifestPath
+        self.profile = profile
+        self.pending: Dict[str, List[str]] = {}
+        self.loadTimes: Dict[str, float] = {}
+        self.importTimes: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.manifest = self.readManifest(manifestPath)
+
+    @staticmethod
+    def readManifest(manifestPath: Path) -> Dict[str, Dict[str, Any]]:
+        """
+        Reads the extension manifest so it can be used before the bot is created.
+
+        Parameters
+        ----------
+        manifestPath: Path
+            The path to the manifest.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            The commands and gateway requirements of each extension. The requirements are None if they aren't known yet.
+        """
+        try:
+            manifest = json.loads(manifestPath.read_text())
+        except (OSError, ValueError):
+            return {}
+        # Older manifests only stored the commands
+        return {extension: entry if isinstance(entry, dict) else {"commands": entry, "requirements": None} for extension, entry in manifest.items()}
+
+    def _saveManifest(self) -> None:
+        """Writes the extension manifest to disk."""
+        self.manifestPath.parent.mkdir(parents=True, exist_ok=True)
+        self.manifestPath.write_text(json.dumps(self.manifest, indent=4))
+
+    def discover(self, extensions: List[str], lazy: bool) -> None:
+        """
+        Loads a list of extensions.
+
+        Parameters
+        ----------
+        extensions: List[str]
+            The extensions to load.
+        lazy: bool
+            Whether to defer loading extensions which are already in the manifest until they are needed.
+        """
+        for extension in extensions:
+            if lazy and extension in self.manifest:
+                self.pending[extension] = self.manifest[extension]["commands"]
+            else:
+                self.load(extension)
+
+    def load(self, extension: str) -> List[str]:
+        """
+        Imports and sets up an extension straight away.
+
+        Parameters
+        ----------
+        extension: str
+            The extension to load.
+
+        Returns
+        -------
+        List[str]
+            The names of the cogs the extension added.
+        """
+        cogs = set(self.bot.cogs)
+        commands = {command.name for command in self.bot.pending_application_commands}
+        start = time.perf_counter()
+        if self.profile:
+            with profileImports(self.importTimes):
+                self.bot.load_extension(extension)
+        else:
+            self.bot.load_extension(extension)
+        self.loadTimes[extension] = time.perf_counter()-start
+        self.pending.pop(extension, None)
+        # Remember which commands the extension provides so it can be loaded lazily next time
+        # along with the intents and caches its cogs need so the lean gateway mode knows them before connecting
+        newCogs = [name for name in self.bot.cogs if name not in cogs]
+        entry = {"commands": sorted({command.name for command in self.bot.pending_application_commands}-commands),
+                 "requirements": mergeRequirements(cogRequirements(self.bot.cogs[name]) for name in newCogs)}
+        if self.manifest.get(extension) != entry:
+            self.manifest[extension] = entry
+            self._saveManifest()
+        return newCogs
+
+    def extensionForCommand(self, name: str) -> Optional[str]:
+        """Finds the pending extension which provides a given command."""
+        for extension, commands in self.pending.items():
+            if name in commands:
+                return extension
+        return None
+
+    async def loadPending(self, extension: str) -> List[str]:
+        """
+        Loads a pending extension, making sure it is only loaded once even if it is needed by multiple interactions.
+
+        Parameters
+        ----------
+        extension: str
+            The extension to load.
+
+        Returns
+        -------
+        List[str]
+            The names of the cogs the extension added or an empty list if it was already loaded.
+        """
+        async with self._locks.setdefault(extension, asyncio.Lock()):
+            if extension not in self.pending:
+                return []
+            return self.load(extension)
+
+    def report(self, limit: int = 15) -> str:
+        """Returns a summary of the extension load times and the slowest imports."""
+        lines = [f"{extension}: {duration*1000:.1f}ms" for extension, duration in self.loadTimes.items()]
+        if self.importTimes:
+            lines.append("Slowest imports (cumulative):")
+            slowest = sorted(self.importTimes.items(), key=lambda item: item[1], reverse=True)[:limit]
+            lines.extend(f"    {name}: {duration*1000:.1f}ms" for name, duration in slowest)
+        return "\n".join(lines)
@@ -0,0 +1,53 @@
+# Builtin
+import asyncio
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# uvloop is optional so the bot still runs on the standard event loop when it isn't installed. JSON isn't handled here
+# since py-cord already uses orjson by itself whenever it is installed
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def newEventLoop(fast: bool) -> asyncio.AbstractEventLoop:
+    """Creates a uvloop event loop if it is installed and requested, otherwise a standard one."""
+    if fast and uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def installEventLoop() -> bool:
+    """
+    Makes every new event loop a uvloop one. This has to run before the bot is created since the bot grabs its loop then.
+
+    Returns
+    -------
+    bool
+        Whether uvloop was installed.
+    """
+    if uvloop is None:
+        logger.warning("uvloop isn't installed so the default event loop is being used")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+def enable(useUvloop: bool = True) -> Dict[str, Optional[bool]]:
+    """
+    Turns on the high performance runtime, falling back to the standard library for anything which isn't installed.
+
+    Parameters
+    ----------
+    useUvloop: bool
+        Whether to try to use uvloop.
+
+    Returns
+    -------
+    Dict[str, Optional[bool]]
+        Whether each part was installed or None if it wasn't requested.
+    """
+    return {"uvloop": installEventLoop() if useUvloop else None}
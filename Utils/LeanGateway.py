@@ -0,0 +1,111 @@
+# Builtin
+import sys
+from typing import Any, Dict, Iterable, Optional
+# Pip
+import discord
+
+# The resource module is only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Intents which are always needed to keep the guild and channel caches that slash commands rely on
+baseIntents = ("guilds",)
+
+
+def cogRequirements(cog: discord.Cog) -> Dict[str, Any]:
+    """
+    Gets the gateway intents and caches a cog has opted into.
+
+    Cogs declare these with the class attributes requiredIntents (intent names), memberCache (member cache flag names)
+    and messageCache (how many messages to keep).
+
+    Parameters
+    ----------
+    cog: discord.Cog
+        The cog to check.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The cog's requirements in a JSON serializable form.
+    """
+    return {"intents": sorted(getattr(cog, "requiredIntents", ())),
+            "memberCache": sorted(getattr(cog, "memberCache", ())),
+            "messageCache": getattr(cog, "messageCache", 0)}
+
+
+def mergeRequirements(requirements: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combines the requirements of multiple cogs."""
+    merged = {"intents": set(baseIntents), "memberCache": set(), "messageCache": 0}
+    for requirement in requirements:
+        merged["intents"].update(requirement["intents"])
+        merged["memberCache"].update(requirement["memberCache"])
+        merged["messageCache"] = max(merged["messageCache"], requirement["messageCache"])
+    return {"intents": sorted(merged["intents"]), "memberCache": sorted(merged["memberCache"]), "messageCache": merged["messageCache"]}
+
+
+def leanOptions(requirements: Iterable[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Builds the bot options which only enable the intents and caches the cogs need.
+
+    Parameters
+    ----------
+    requirements: Iterable[Optional[Dict[str, Any]]]
+        The requirements of every extension which will be loaded. None means an extension's requirements aren't known yet.
+
+    Returns
+    -------
+    Optional[Dict[str, Any]]
+        The options to pass to the bot or None if any requirements are unknown and the library defaults should be used.
+    """
+    requirements = list(requirements)
+    if any(requirement is None for requirement in requirements):
+        return None
+    merged = mergeRequirements(requirements)
+    intents = discord.Intents.none()
+    for name in merged["intents"]:
+        setattr(intents, name, True)
+    memberCacheFlags = discord.MemberCacheFlags.none()
+    for name in merged["memberCache"]:
+        setattr(memberCacheFlags, name, True)
+    return {"intents": intents,
+            "member_cache_flags": memberCacheFlags,
+            "max_messages": merged["messageCache"] or None,
+            "chunk_guilds_at_startup": False}
+
+
+def missingRequirements(bot: discord.Bot, requirement: Dict[str, Any]) -> Dict[str, Any]:
+    """Finds the intents and caches a cog needs which the bot wasn't started with."""
+    return {"intents": [name for name in requirement["intents"] if not getattr(bot.intents, name)],
+            "memberCache": [name for name in requirement["memberCache"] if not getattr(bot._connection.member_cache_flags, name)],
+            "messageCache": requirement["messageCache"] if requirement["messageCache"] > (bot._connection.max_messages or 0) else 0}
+
+
+def cacheReport(bot: discord.Bot) -> Dict[str, float]:
+    """
+    Measures the size of the bot's gateway caches.
+
+    Parameters
+    ----------
+    bot: discord.Bot
+        The bot to measure.
+
+    Returns
+    -------
+    Dict[str, float]
+        The size of each cache, the peak memory usage and the peak memory usage per 1,000 guilds.
+    """
+    guilds = len(bot.guilds)
+    # Linux reports the peak resident set size in kilobytes and macOS reports it in bytes
+    peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*(1 if sys.platform == "darwin" else 1024) if resource is not None else 0
+    return {"guilds": guilds,
+            "channels": sum(len(guild.channels) for guild in bot.guilds),
+            "members": sum(len(guild.members) for guild in bot.guilds),
+            "users": len(bot.users),
+            "voiceStates": sum(len(guild._voice_states) for guild in bot.guilds),
+            "messages": len(bot.cached_messages),
+            "intents": bot.intents.value,
+            "peakMemoryMiB": peakMemory/1048576,
+            "peakMemoryMiBPer1000Guilds": peakMemory/1048576/guilds*1000 if guilds else 0.0}
@@ -0,0 +1,187 @@
+# Builtin
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# Formats log records as single line JSON objects
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {"time": record.created,
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage()}
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+# Drops DEBUG records from noisy loggers by sampling them and capping how many get through each second
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limits: Dict[str, Tuple[float, int]]) -> None:
+        """
+        Parameters
+        ----------
+        limits: Dict[str, Tuple[float, int]]
+            Maps a logger name to the fraction of its DEBUG records to keep and the maximum amount kept per second.
+            The limit also applies to any child loggers.
+        """
+        super().__init__()
+        self.limits = limits
+        self.dropped = 0
+        self._windows: Dict[str, Tuple[int, int]] = {}
+
+    def _findLimit(self, name: str) -> Optional[Tuple[str, Tuple[float, int]]]:
+        """Finds the most specific limit which applies to a logger."""
+        while name:
+            if name in self.limits:
+                return name, self.limits[name]
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        limit = self._findLimit(record.name)
+        if limit is None:
+            return True
+        name, (sampleRate, perSecond) = limit
+        if sampleRate < 1 and random.random() >= sampleRate:
+            self.dropped += 1
+            return False
+        second = int(record.created)
+        windowSecond, count = self._windows.get(name, (second, 0))
+        if windowSecond != second:
+            windowSecond, count = second, 0
+        if count >= perSecond:
+            self.dropped += 1
+            return False
+        self._windows[name] = (windowSecond, count+1)
+        return True
+
+
+# Writes log records to a file from a background thread in batches, rotating the file when it gets too big or old
+class BatchedFileWriter(threading.Thread):
+    def __init__(self,
+                 recordQueue: "queue.Queue[Optional[logging.LogRecord]]",
+                 path: Path,
+                 formatter: logging.Formatter,
+                 maxBytes: int = 50*1024*1024,
+                 maxAge: float = 24*60*60,
+                 backupCount: int = 5,
+                 batchSize: int = 500,
+                 flushInterval: float = 1
+                 ) -> None:
+        super().__init__(name="LogWriter", daemon=True)
+        self.recordQueue = recordQueue
+        self.path = path
+        self.formatter = formatter
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.backupCount = backupCount
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened = time.time()
+
+    def _rotate(self) -> None:
+        """Moves the current log file to a numbered backup and starts a new one."""
+        self._file.close()
+        for number in range(self.backupCount-1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{number}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{number+1}"))
+        if self.backupCount > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened = time.time()
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        """Formats and writes a batch of records in one go."""
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                lines.append(f"Unable to format log record {record.name}:{record.msg!r}")
+        self._file.write("\n".join(lines)+"\n")
+        self._file.flush()
+        if self._file.tell() >= self.maxBytes or time.time()-self._opened >= self.maxAge:
+            self._rotate()
+
+    def run(self) -> None:
+        running = True
+        while running:
+            records = []
+            try:
+                record = self.recordQueue.get(timeout=self.flushInterval)
+            except queue.Empty:
+                continue
+            # Grab everything else which is already waiting so it is written in the same batch
+            while record is not None:
+                records.append(record)
+                if len(records) >= self.batchSize:
+                    break
+                try:
+                    record = self.recordQueue.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                running = False
+            if records:
+                self._write(records)
+        self._file.close()
+
+    def stop(self) -> None:
+        """Writes any waiting records and stops the thread."""
+        self.recordQueue.put(None)
+        self.join()
+
+
+def setupQueuedLogging(logger: logging.Logger,
+                       path: Path,
+                       jsonLines: bool = False,
+                       rateLimits: Optional[Dict[str, Tuple[float, int]]] = None,
+                       **writerOptions
+                       ) -> BatchedFileWriter:
+    """
+    Makes a logger hand its records to a background writer thread instead of writing to disk itself.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        The logger to set up.
+    path: Path
+        The file to write to.
+    jsonLines: bool
+        Whether to write each record as a JSON object instead of plain text.
+    rateLimits: Optional[Dict[str, Tuple[float, int]]]
+        The sample rate and maximum records per second to apply to DEBUG records from specific loggers.
+    writerOptions
+        Any extra options to pass to the :class:`BatchedFileWriter`.
+
+    Returns
+    -------
+    BatchedFileWriter
+        The started writer thread.
+    """
+    recordQueue: "queue.Queue[Optional[logging.LogRecord]]" = queue.Queue()
+    formatter = JsonFormatter() if jsonLines else logging.Formatter('%(asctime)s:%(levelname)s:%(name)s:%(message)s')
+    writer = BatchedFileWriter(recordQueue, path, formatter, **writerOptions)
+    writer.start()
+    atexit.register(writer.stop)
+    handler = QueueHandler(recordQueue)
+    if rateLimits:
+        handler.addFilter(RateLimitFilter(rateLimits))
+    logger.addHandler(handler)
+    return writer
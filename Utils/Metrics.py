@@ -0,0 +1,196 @@
+# Builtin
+import asyncio
+import contextvars
+import functools
+import json
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+# Pip
+import discord
+
+# Default histogram buckets in seconds
+defaultBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Holds the name, start time and phase timings of the command running in the current task
+currentCommand: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("currentCommand", default=None)
+
+
+# Counts how many observations fall into each bucket
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = defaultBuckets) -> None:
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets)+1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Records a single value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, quantile: float) -> float:
+        """Estimates a quantile using the upper bound of the bucket it falls into."""
+        target = quantile*self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= target:
+                return bound
+        return float("inf")
+
+
+# Collects counters, gauges and histograms and exports them
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {"event_loop_lag_last_seconds": lambda: self.lastLoopLag}
+        self.lastLoopLag = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Increments a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0)+amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Records a value in a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        """Registers a gauge which is read whenever the metrics are exported."""
+        self.gauges[name] = func
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Times a phase of the command running in the current task."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            command = currentCommand.get()
+            if command is not None:
+                command["phases"][name] = command["phases"].get(name, 0)+time.perf_counter()-start
+
+    def lavalinkCall(self, func: Callable) -> Callable:
+        """Decorates a coroutine which talks to Lavalink so it is counted and timed as the lavalink phase."""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            self.increment("lavalink_requests_total", operation=func.__name__)
+            with self.phase("lavalink"):
+                return await func(*args, **kwargs)
+        return wrapper
+
+    async def beforeCommand(self, ctx: discord.ApplicationContext) -> None:
+        """Bot wide hook which starts timing an application command."""
+        currentCommand.set({"name": ctx.command.qualified_name, "start": time.perf_counter(), "phases": {}})
+
+    async def afterCommand(self, ctx: discord.ApplicationContext) -> None:
+        """Bot wide hook which records an application command's timings."""
+        command = currentCommand.get()
+        if command is None:
+            return
+        currentCommand.set(None)
+        self.observe("command_latency_seconds", time.perf_counter()-command["start"], command=command["name"], phase="total")
+        for phase, duration in command["phases"].items():
+            self.observe("command_latency_seconds", duration, command=command["name"], phase=phase)
+        self.increment("commands_total", command=command["name"])
+
+    async def monitorLoopLag(self, interval: float = 0.5) -> None:
+        """Measures how late the event loop wakes up compared to when it was asked to."""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter()-start-interval)
+            self.observe("event_loop_lag_seconds", lag)
+            self.lastLoopLag = lag
+
+    @staticmethod
+    def _formatLabels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        """Formats labels in the Prometheus text format."""
+        labels = labels+extra
+        if not labels:
+            return ""
+        return "{"+",".join(f'{key}="{value}"' for key, value in labels)+"}"
+
+    def render(self) -> str:
+        """Exports every metric in the Prometheus text format."""
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{self._formatLabels(labels)} {value}")
+        for name, func in sorted(self.gauges.items()):
+            lines.append(f"{name} {func()}")
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            total = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                total += count
+                lines.append(f"{name}_bucket{self._formatLabels(labels, (('le', str(bound)),))} {total}")
+            lines.append(f"{name}_bucket{self._formatLabels(labels, (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{self._formatLabels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{self._formatLabels(labels)} {histogram.count}")
+        return "\n".join(lines)+"\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Exports a summary of every metric as a dictionary."""
+        return {"counters": {f"{name}{self._formatLabels(labels)}": value for (name, labels), value in self.counters.items()},
+                "gauges": {name: func() for name, func in self.gauges.items()},
+                "histograms": {f"{name}{self._formatLabels(labels)}": {"count": histogram.count,
+                                                                       "sum": histogram.sum,
+                                                                       "p50": histogram.quantile(0.5),
+                                                                       "p99": histogram.quantile(0.99)}
+                               for (name, labels), histogram in self.histograms.items()}}
+
+    async def _handleScrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers a single HTTP request with the Prometheus text export."""
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.render().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()+body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _writeSnapshots(self, path: Path, interval: float) -> None:
+        """Periodically writes a snapshot of every metric to a file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            await asyncio.sleep(interval)
+            snapshot = json.dumps(self.snapshot(), indent=4)
+            await asyncio.get_running_loop().run_in_executor(None, path.write_text, snapshot)
+
+    async def start(self, port: Optional[int] = None, snapshotPath: Optional[Path] = None, snapshotInterval: float = 60) -> None:
+        """
+        Starts the loop lag monitor and any exporters.
+
+        Parameters
+        ----------
+        port: Optional[int]
+            The local port to serve the Prometheus text export on.
+        snapshotPath: Optional[Path]
+            The file to periodically write snapshots to.
+        snapshotInterval: float
+            How often to write snapshots in seconds.
+        """
+        self._tasks.append(asyncio.create_task(self.monitorLoopLag()))
+        if snapshotPath is not None:
+            self._tasks.append(asyncio.create_task(self._writeSnapshots(snapshotPath, snapshotInterval)))
+        # Started last so the other exporters still run if the port can't be bound
+        if port is not None:
+            await asyncio.start_server(self._handleScrape, "127.0.0.1", port)
+
+
+# Shared registry used throughout the bot
+metrics = MetricsRegistry()
@@ -0,0 +1,114 @@
+# Builtin
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, List, Optional
+# Pip
+import discord
+import lavapy
+
+if TYPE_CHECKING:
+    from Cogs.Music import CustomPlayer
+
+logger = logging.getLogger(__name__)
+
+
+# Spreads players over multiple Lavalink nodes and moves them off nodes which go down
+class NodeBalancer:
+    def __init__(self, degradedPenalty: float = 500, checkInterval: float = 30) -> None:
+        self.degradedPenalty = degradedPenalty
+        self.checkInterval = checkInterval
+        self.nodes: List[lavapy.Node] = []
+        self.players: Dict[int, "CustomPlayer"] = {}
+        self._monitorTask: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def isConnected(node: lavapy.Node) -> bool:
+        """Checks whether a node's websocket to Lavalink is currently open."""
+        websocket = node._websocket
+        return websocket is not None and websocket.connected
+
+    @classmethod
+    def penalty(cls, node: lavapy.Node) -> float:
+        """
+        Works out how loaded a node is from its reported stats.
+
+        Parameters
+        ----------
+        node: lavapy.Node
+            The node to score.
+
+        Returns
+        -------
+        float
+            Lavapy's penalty for the node, which covers playing players, CPU load and lost frames. Lower is better and a
+            disconnected node has an infinite penalty.
+        """
+        if not cls.isConnected(node):
+            return float("inf")
+        if node.stats is None:
+            return 0
+        return node.stats.penalty.total
+
+    def addNode(self, node: lavapy.Node) -> None:
+        """Registers a node so players can be placed on it."""
+        self.nodes.append(node)
+
+    def bestNode(self, exclude: Optional[lavapy.Node] = None) -> Optional[lavapy.Node]:
+        """
+        Finds the least loaded healthy node.
+
+        Parameters
+        ----------
+        exclude: Optional[lavapy.Node]
+            A node which shouldn't be picked.
+
+        Returns
+        -------
+        Optional[lavapy.Node]
+            The best node or None if there are no healthy nodes.
+        """
+        candidates = [(self.penalty(node), node) for node in self.nodes if node is not exclude]
+        candidates = [candidate for candidate in candidates if candidate[0] != float("inf")]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda candidate: candidate[0])[1]
+
+    def place(self, player: "CustomPlayer") -> None:
+        """Puts a newly created player on the best node."""
+        node = self.bestNode()
+        if node is not None:
+            player.assignNode(node)
+
+    def add(self, player: "CustomPlayer") -> None:
+        """Starts tracking a player once it has connected so it can be moved off a failing node."""
+        self.players[player.guild.id] = player
+
+    def remove(self, player: "CustomPlayer") -> None:
+        """Stops tracking a player once it has been destroyed."""
+        self.players.pop(player.guild.id, None)
+
+    async def rebalance(self) -> None:
+        """Moves players off any node which is down or degraded."""
+        for player in list(self.players.values()):
+            penalty = self.penalty(player.node)
+            if penalty < self.degradedPenalty:
+                continue
+            node = self.bestNode(exclude=player.node)
+            if node is None or self.penalty(node) >= penalty:
+                continue
+            logger.info(f"Migrating player for guild {player.guild.id} to node {node.identifier}")
+            try:
+                await player.moveToNode(node)
+            except (discord.DiscordException, lavapy.LavapyException) as error:
+                logger.warning(f"Failed to migrate player for guild {player.guild.id}: {error}")
+
+    async def _monitor(self) -> None:
+        """Periodically checks the health of every node."""
+        while True:
+            await asyncio.sleep(self.checkInterval)
+            await self.rebalance()
+
+    def start(self) -> None:
+        """Starts monitoring the nodes."""
+        if self._monitorTask is None:
+            self._monitorTask = asyncio.create_task(self._monitor())
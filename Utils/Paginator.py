@@ -1,12 +1,147 @@
 """This uses an experimental version of ext.menus which is yet to be merged.
 Once it is merged, I will use that instead and delete this."""
-from typing import Dict, List, Optional, Union
+import asyncio
+import inspect
+import logging
+import weakref
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, Union
 
 import discord
 from discord import abc
 from discord.commands import ApplicationContext
 from discord.ext.commands import Context
 
+logger = logging.getLogger(__name__)
+
+
+class PageSource:
+    """Lazily renders pages on demand instead of building them all up front.
+    Parameters
+    ----------
+    page_count: :class:`int`
+        The total number of pages this source can render
+    render: Callable[[:class:`int`], Union[:class:`str`, :class:`discord.Embed`, Awaitable[Union[:class:`str`, :class:`discord.Embed`]]]]
+        A sync or async callable which takes a zero-indexed page number and returns the page
+    cache_size: :class:`int`
+        How many recently rendered pages to keep around
+    """
+
+    def __init__(
+        self,
+        page_count: int,
+        render: Callable[[int], Union[str, discord.Embed, Awaitable[Union[str, discord.Embed]]]],
+        cache_size: int = 8,
+    ):
+        self.page_count = page_count
+        self.render = render
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Union[str, discord.Embed]]" = OrderedDict()
+
+    def __len__(self):
+        return self.page_count
+
+    async def get_page(self, page_number: int) -> Union[str, discord.Embed]:
+        """Returns the specified page, rendering it if it isn't already cached.
+        Parameters
+        ----------
+        page_number: :class:`int`
+            The zero-indexed page to get.
+        Returns
+        -------
+        Union[:class:`str`, :class:`discord.Embed`]
+            The rendered page.
+        """
+        if page_number in self._cache:
+            self._cache.move_to_end(page_number)
+            return self._cache[page_number]
+        page = self.render(page_number)
+        if inspect.isawaitable(page):
+            page = await page
+        self._cache[page_number] = page
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return page
+
+    def clear(self):
+        """Drops all cached pages."""
+        self._cache.clear()
+
+
+class PaginatorRegistry:
+    """Keeps track of every live paginator so the amount of views and pages held in memory stays bounded.
+    When a cap is reached the least recently used paginator is expired, disabling its buttons.
+    Parameters
+    ----------
+    max_per_guild: :class:`int`
+        The maximum amount of live paginators in a single guild
+    max_total: :class:`int`
+        The maximum amount of live paginators across every guild
+    """
+
+    def __init__(self, max_per_guild: int = 3, max_total: int = 500):
+        self.max_per_guild = max_per_guild
+        self.max_total = max_total
+        self._paginators: "OrderedDict[int, Paginator]" = OrderedDict()
+        self._guilds: Dict[Optional[int], "OrderedDict[int, Paginator]"] = {}
+        # Sources are only kept alive by the paginators showing them, so they are released along with the last one
+        self._sources: "weakref.WeakValueDictionary[Hashable, PageSource]" = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._paginators)
+
+    def source(self, key: Hashable, factory: Callable[[], PageSource]) -> PageSource:
+        """Gets the shared page source for a key, creating it if no live paginator is using it.
+        Parameters
+        ----------
+        key: Hashable
+            Identifies the data being shown. This should change whenever the data does.
+        factory: Callable[[], :class:`PageSource`]
+            Creates the page source if it doesn't exist.
+        Returns
+        -------
+        :class:`PageSource`
+            The shared page source.
+        """
+        source = self._sources.get(key)
+        if source is None:
+            source = factory()
+            self._sources[key] = source
+        return source
+
+    async def register(self, paginator: "Paginator", guild_id: Optional[int]):
+        """Starts tracking a paginator, expiring the least recently used ones if a cap is exceeded.
+        Parameters
+        ----------
+        paginator: :class:`Paginator`
+            The paginator which has just been sent.
+        guild_id: Optional[:class:`int`]
+            The guild the paginator was sent in.
+        """
+        paginator.guild_id = guild_id
+        self._paginators[id(paginator)] = paginator
+        guild = self._guilds.setdefault(guild_id, OrderedDict())
+        guild[id(paginator)] = paginator
+        while len(guild) > self.max_per_guild:
+            await next(iter(guild.values())).expire()
+        while len(self._paginators) > self.max_total:
+            await next(iter(self._paginators.values())).expire()
+
+    def touch(self, paginator: "Paginator"):
+        """Marks a paginator as recently used."""
+        if id(paginator) in self._paginators:
+            self._paginators.move_to_end(id(paginator))
+            self._guilds[paginator.guild_id].move_to_end(id(paginator))
+
+    def unregister(self, paginator: "Paginator"):
+        """Stops tracking a paginator."""
+        if self._paginators.pop(id(paginator), None) is None:
+            return
+        guild = self._guilds[paginator.guild_id]
+        del guild[id(paginator)]
+        if not guild:
+            del self._guilds[paginator.guild_id]
+
 
 class PaginatorButton(discord.ui.Button):
     """Creates a button used to navigate the paginator.
@@ -29,15 +164,19 @@ class PaginatorButton(discord.ui.Button):
         self.paginator = paginator
 
     async def callback(self, interaction: discord.Interaction):
+        # Acknowledge the interaction straight away so the response deadline is never missed
+        await interaction.response.defer()
+        if self.paginator.registry is not None:
+            self.paginator.registry.touch(self.paginator)
         if self.button_type == "first":
             self.paginator.current_page = 0
         elif self.button_type == "prev":
-            self.paginator.current_page -= 1
+            self.paginator.current_page = max(self.paginator.current_page - 1, 0)
         elif self.button_type == "next":
-            self.paginator.current_page += 1
+            self.paginator.current_page = min(self.paginator.current_page + 1, self.paginator.page_count)
         elif self.button_type == "last":
             self.paginator.current_page = self.paginator.page_count
-        await self.paginator.goto_page(interaction=interaction, page_number=self.paginator.current_page)
+        self.paginator.schedule_edit(interaction)
 
 
 class Paginator(discord.ui.View):
@@ -64,17 +203,27 @@ class Paginator(discord.ui.View):
         Choose whether or not only the original user of the command can change pages
     custom_view: Optional[:class:`discord.ui.View`]
         A custom view whose items are appended below the pagination buttons
+    edit_delay: :class:`float`
+        How long to wait for further button presses before editing the message.
+        Rapid presses are coalesced so only the final page is sent
+    timeout: Optional[:class:`float`]
+        How long the Paginator can go without a button press before its buttons are disabled and its pages released
+    registry: Optional[:class:`PaginatorRegistry`]
+        A registry which bounds how many paginators can be live at once
     """
 
     def __init__(
         self,
-        pages: Union[List[str], List[discord.Embed]],
+        pages: Union[List[str], List[discord.Embed], PageSource],
         show_disabled=True,
         show_indicator=True,
         author_check=True,
         custom_view: Optional[discord.ui.View] = None,
+        edit_delay: float = 0.3,
+        timeout: Optional[float] = 180.0,
+        registry: Optional[PaginatorRegistry] = None,
     ):
-        super().__init__()
+        super().__init__(timeout=timeout)
         self.pages = pages
         self.current_page = 0
         self.page_count = len(self.pages) - 1
@@ -136,6 +285,13 @@ class Paginator(discord.ui.View):
             },
         }
         self.custom_view = custom_view
+        self.edit_delay = edit_delay
+        self._edit_task: Optional[asyncio.Task] = None
+        self._edit_interaction: Optional[discord.Interaction] = None
+        self.registry = registry
+        self.guild_id: Optional[int] = None
+        self.message: Optional[Union[discord.Message, discord.WebhookMessage]] = None
+        self._interaction: Optional[discord.Interaction] = None
         self.update_buttons()
 
         self.usercheck = author_check
@@ -157,10 +313,83 @@ class Paginator(discord.ui.View):
             The Paginator class
         """
         self.update_buttons()
-        page = self.pages[page_number]
-        await interaction.response.edit_message(
-            content=page if isinstance(page, str) else None, embed=page if isinstance(page, discord.Embed) else None, view=self
-        )
+        page = await self.get_page(page_number)
+        if interaction.response.is_done():
+            await interaction.edit_original_message(
+                content=page if isinstance(page, str) else None, embed=page if isinstance(page, discord.Embed) else None, view=self
+            )
+        else:
+            await interaction.response.edit_message(
+                content=page if isinstance(page, str) else None, embed=page if isinstance(page, discord.Embed) else None, view=self
+            )
+
+    def schedule_edit(self, interaction: discord.Interaction):
+        """Schedules the message to be edited to show the current page once the buttons stop being pressed.
+        Parameters
+        ----------
+        interaction: :class:`discord.Interaction`
+            The latest (already acknowledged) interaction on the Paginator's message
+        """
+        self._edit_interaction = interaction
+        if self._edit_task is None or self._edit_task.done():
+            self._edit_task = asyncio.create_task(self._debounced_edit())
+            self._edit_task.add_done_callback(self._edit_done)
+
+    @staticmethod
+    def _edit_done(task: asyncio.Task):
+        # Nothing awaits the edit task so its errors would otherwise never be seen
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to edit a paginator message", exc_info=task.exception())
+
+    async def _debounced_edit(self):
+        await asyncio.sleep(self.edit_delay)
+        # Keep going until the page stops changing in case more presses arrive during an edit
+        while True:
+            target = self.current_page
+            await self.goto_page(interaction=self._edit_interaction, page_number=target)
+            if self.current_page == target:
+                break
+
+    async def get_page(self, page_number: int) -> Union[str, discord.Embed]:
+        """Gets the specified page, rendering it first if the pages come from a :class:`PageSource`.
+        Parameters
+        ----------
+        page_number: :class:`int`
+            The zero-indexed page to get.
+        Returns
+        -------
+        Union[:class:`str`, :class:`discord.Embed`]
+            The requested page.
+        """
+        if isinstance(self.pages, PageSource):
+            return await self.pages.get_page(page_number)
+        return self.pages[page_number]
+
+    async def on_timeout(self):
+        await self.expire()
+
+    async def expire(self):
+        """Disables the buttons, stops listening for presses and releases the pages."""
+        if self.registry is not None:
+            self.registry.unregister(self)
+        self.stop()
+        if self._edit_task is not None:
+            self._edit_task.cancel()
+            self._edit_task = None
+        self._edit_interaction = None
+        self.pages = []
+        for item in self.children:
+            item.disabled = True
+        # The message may have been deleted or the interaction token may have expired
+        try:
+            if self.message is not None:
+                await self.message.edit(view=self)
+            elif self._interaction is not None:
+                await self._interaction.edit_original_message(view=self)
+        except discord.HTTPException:
+            pass
+        self.message = None
+        self._interaction = None
 
     async def interaction_check(self, interaction):
         if self.usercheck:
@@ -202,47 +431,36 @@ class Paginator(discord.ui.View):
         Dict[:class:`str`, Dict[:class:`str`, Union[:class:`~PaginatorButton`, :class:`bool`]]]
             The dictionary of buttons that was updated.
         """
-        for key, button in self.buttons.items():
-            if key == "first":
-                if self.current_page <= 1:
-                    button["hidden"] = True
-                elif self.current_page >= 1:
-                    button["hidden"] = False
-            elif key == "last":
-                if self.current_page >= self.page_count - 1:
-                    button["hidden"] = True
-                if self.current_page < self.page_count - 1:
-                    button["hidden"] = False
-            elif key == "next":
-                if self.current_page == self.page_count:
-                    button["hidden"] = True
-                elif self.current_page < self.page_count:
-                    button["hidden"] = False
-            elif key == "prev":
-                if self.current_page <= 0:
-                    button["hidden"] = True
-                elif self.current_page >= 0:
-                    button["hidden"] = False
-        self.clear_items()
+        hidden = {
+            "first": self.current_page <= 1,
+            "prev": self.current_page <= 0,
+            "next": self.current_page >= self.page_count,
+            "last": self.current_page >= self.page_count - 1,
+        }
+        visibility_changed = False
+        for key, is_hidden in hidden.items():
+            button = self.buttons[key]
+            visibility_changed = visibility_changed or button["hidden"] != is_hidden
+            button["hidden"] = is_hidden
+            button["object"].disabled = is_hidden
         if self.show_indicator:
             self.buttons["page_indicator"]["object"].label = f"{self.current_page + 1}/{self.page_count + 1}"
-        for key, button in self.buttons.items():
-            if key != "page_indicator":
-                if button["hidden"]:
-                    button["object"].disabled = True
-                    if self.show_disabled:
+
+        # Disabled buttons stay in place, so the view only needs rebuilding when buttons are being hidden
+        if not self.children or (visibility_changed and not self.show_disabled):
+            self.clear_items()
+            for key, button in self.buttons.items():
+                if key != "page_indicator":
+                    if not button["hidden"] or self.show_disabled:
                         self.add_item(button["object"])
-                else:
-                    button["object"].disabled = False
+                elif self.show_indicator:
                     self.add_item(button["object"])
-            elif self.show_indicator:
-                self.add_item(button["object"])
 
-        # We're done adding standard buttons, so we can now add any specified custom view items below them
-        # The bot developer should handle row assignments for their view before passing it to Paginator
-        if self.custom_view:
-            for item in self.custom_view.children:
-                self.add_item(item)
+            # We're done adding standard buttons, so we can now add any specified custom view items below them
+            # The bot developer should handle row assignments for their view before passing it to Paginator
+            if self.custom_view:
+                for item in self.custom_view.children:
+                    self.add_item(item)
 
         return self.buttons
 
@@ -263,24 +481,32 @@ class Paginator(discord.ui.View):
         if not isinstance(messageable, abc.Messageable):
             raise TypeError("messageable should be a subclass of abc.Messageable")
 
-        page = self.pages[0]
+        page = await self.get_page(0)
 
         if isinstance(messageable, (ApplicationContext, Context)):
             self.user = messageable.author
 
         if isinstance(messageable, ApplicationContext):
-            await messageable.respond(
+            sent = await messageable.respond(
                 content=page if isinstance(page, str) else None,
                 embed=page if isinstance(page, discord.Embed) else None,
                 view=self,
                 ephemeral=ephemeral,
             )
         else:
-            await messageable.send(
+            sent = await messageable.send(
                 content=page if isinstance(page, str) else None,
                 embed=page if isinstance(page, discord.Embed) else None,
                 view=self,
             )
+        if isinstance(sent, discord.Interaction):
+            self._interaction = sent
+        else:
+            self.message = sent
+
+        if self.registry is not None:
+            guild = getattr(messageable, "guild", None)
+            await self.registry.register(self, guild.id if guild is not None else None)
         return messageable
 
     async def respond(self, interaction: discord.Interaction, ephemeral: bool = False):
@@ -296,11 +522,11 @@ class Paginator(discord.ui.View):
         :class:`~discord.Interaction`
             The interaction associated with this response.
         """
-        page = self.pages[0]
+        page = await self.get_page(0)
         self.user = interaction.user
 
         if interaction.response.is_done():
-            await interaction.followup.send(
+            self.message = await interaction.followup.send(
                 content=page if isinstance(page, str) else None, embed=page if isinstance(page, discord.Embed) else None, view=self, ephemeral=ephemeral
             )
 
@@ -308,4 +534,153 @@ class Paginator(discord.ui.View):
             await interaction.response.send_message(
                 content=page if isinstance(page, str) else None, embed=page if isinstance(page, discord.Embed) else None, view=self, ephemeral=ephemeral
             )
-        return interaction
\ No newline at end of file
+            self._interaction = interaction
+
+        if self.registry is not None:
+            await self.registry.register(self, interaction.guild_id)
+        return interaction
+
+
+class PersistentPaginatorHandler:
+    """Paginates without keeping a view per message by encoding the page to show in each button's ``custom_id``.
+    Button presses are handled by :meth:`handle`, which re-renders the requested page from the current data,
+    so pagination keeps working after a restart.
+    Sources are named and resolved on demand. A resolver takes the key stored in the message and returns the
+    current key and :class:`PageSource` for that data, or None if the data no longer exists.
+    Parameters
+    ----------
+    author_check: :class:`bool`
+        Whether only the user who ran the command which sent a paginated message can change its page.
+    """
+
+    prefix = "paginator"
+
+    def __init__(self, author_check: bool = True):
+        self.usercheck = author_check
+        self._resolvers: Dict[str, Callable[[str], Optional[Tuple[str, PageSource]]]] = {}
+
+    def add_source(self, name: str, resolver: Callable[[str], Optional[Tuple[str, PageSource]]]):
+        """Registers a named source which paginated messages can be built from.
+        Parameters
+        ----------
+        name: :class:`str`
+            The name of the source. This should match the command which sends it so it can be loaded on demand.
+        resolver: Callable[[:class:`str`], Optional[Tuple[:class:`str`, :class:`PageSource`]]]
+            Gets the current key and page source for a stored key.
+        """
+        self._resolvers[name] = resolver
+
+    def source_name(self, interaction: discord.Interaction) -> Optional[str]:
+        """Returns the name of the source a component interaction belongs to, or None if it isn't a paginator button."""
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        if not custom_id.startswith(f"{self.prefix}:"):
+            return None
+        return custom_id.split(":")[1]
+
+    def build_view(self, name: str, key: str, page_number: int, page_count: int) -> discord.ui.View:
+        """Creates the navigation buttons for a page.
+        Parameters
+        ----------
+        name: :class:`str`
+            The name of the source being shown.
+        key: :class:`str`
+            Identifies the data being shown. This can't contain colons.
+        page_number: :class:`int`
+            The zero-indexed page being shown.
+        page_count: :class:`int`
+            The total number of pages.
+        Returns
+        -------
+        :class:`discord.ui.View`
+            A view which isn't stored by the library, so it uses no memory once sent.
+        """
+        view = discord.ui.View(timeout=None)
+        last_page = page_count - 1
+        buttons = [
+            ("first", "<<", discord.ButtonStyle.blurple, 0, page_number <= 1),
+            ("prev", "<", discord.ButtonStyle.red, page_number - 1, page_number <= 0),
+            ("next", ">", discord.ButtonStyle.green, page_number + 1, page_number >= last_page),
+            ("last", ">>", discord.ButtonStyle.blurple, last_page, page_number >= last_page - 1),
+        ]
+        for button_type, label, style, target, disabled in buttons:
+            if button_type == "next":
+                view.add_item(discord.ui.Button(label=f"{page_number + 1}/{page_count}", style=discord.ButtonStyle.gray, disabled=True, row=0))
+            view.add_item(
+                discord.ui.Button(
+                    label=label, style=style, disabled=disabled, row=0, custom_id=f"{self.prefix}:{name}:{key}:{target}:{button_type}"
+                )
+            )
+        # A finished view is never stored, so presses only reach the global handler
+        view.stop()
+        return view
+
+    async def _render(self, name: str, key: str, page_number: int) -> Optional[Tuple[Union[str, discord.Embed], discord.ui.View]]:
+        resolved = self._resolvers[name](key)
+        if resolved is None:
+            return None
+        key, source = resolved
+        page_number = max(0, min(page_number, len(source) - 1))
+        page = await source.get_page(page_number)
+        return page, self.build_view(name, key, page_number, len(source))
+
+    async def respond(self, interaction: discord.Interaction, name: str, key: str, ephemeral: bool = False) -> bool:
+        """Sends the first page of a source as an interaction response.
+        Parameters
+        ----------
+        interaction: :class:`discord.Interaction`
+            The interaction to respond to.
+        name: :class:`str`
+            The name of the source to show.
+        key: :class:`str`
+            Identifies the data to show.
+        ephemeral: :class:`bool`
+            Choose whether the message is ephemeral or not.
+        Returns
+        -------
+        :class:`bool`
+            Whether the source existed and was sent.
+        """
+        rendered = await self._render(name, key, 0)
+        if rendered is None:
+            return False
+        page, view = rendered
+        # The command may already have been deferred while the extension providing the source was loaded
+        send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+        await send(
+            content=page if isinstance(page, str) else None, embed=page if isinstance(page, discord.Embed) else None, view=view, ephemeral=ephemeral
+        )
+        return True
+
+    async def handle(self, interaction: discord.Interaction) -> bool:
+        """Handles a press of a persistent paginator button.
+        Parameters
+        ----------
+        interaction: :class:`discord.Interaction`
+            Any interaction received by the bot.
+        Returns
+        -------
+        :class:`bool`
+            Whether the interaction was a paginator button press.
+        """
+        name = self.source_name(interaction)
+        if name is None or name not in self._resolvers:
+            return False
+        # Nothing is stored per message so the author comes from the command interaction the message was sent in response to
+        message_interaction = getattr(interaction.message, "interaction", None)
+        if self.usercheck and message_interaction is not None and message_interaction.user.id != interaction.user.id:
+            send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+            await send("Only the user who sent this can change its page.", ephemeral=True)
+            return True
+        _, _, key, page_number, _ = interaction.data["custom_id"].split(":")
+        rendered = await self._render(name, key, int(page_number))
+        # The press may already have been deferred while the extension providing the source was loaded
+        edit = interaction.edit_original_message if interaction.response.is_done() else interaction.response.edit_message
+        if rendered is None:
+            await edit(view=None)
+            return True
+        page, view = rendered
+        await edit(content=page if isinstance(page, str) else None, embed=page if isinstance(page, discord.Embed) else None, view=view)
+        return True
+
+
+persistent_paginators = PersistentPaginatorHandler()
@@ -0,0 +1,245 @@
+# Builtin
+import heapq
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+# Custom
+from Utils.TrackStore import TrackStore
+
+logger = logging.getLogger(__name__)
+
+# Matches any run of whitespace so text can be normalized
+whitespaceRegex = re.compile(r"\s+")
+
+# Discord limits autocomplete choices to 25 and their names and values to 100 characters
+maxChoices = 25
+maxChoiceLength = 100
+
+
+def normalize(text: str) -> str:
+    """Normalizes text so matching ignores case and repeated whitespace."""
+    return whitespaceRegex.sub(" ", text.casefold()).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    """Splits text into every three character substring."""
+    return {text[i:i+3] for i in range(len(text)-2)}
+
+
+def wordPrefixes(text: str) -> Set[str]:
+    """Gets the one and two character prefixes of every word so very short queries can still be matched."""
+    return {word[:length] for word in text.split() for length in (1, 2)}
+
+
+# A single previously played track
+class HistoryEntry:
+    __slots__ = ("uri", "label", "text", "count", "lastUsed", "track")
+
+    def __init__(self, uri: str, label: str, text: str, track: Optional[Tuple[type, str, Dict[str, Any]]]) -> None:
+        self.uri = uri
+        self.label = label
+        self.text = text
+        self.count = 1
+        self.lastUsed = time.monotonic()
+        self.track = track
+
+    def rank(self) -> Tuple[int, float]:
+        """Orders entries by how often and then how recently they were played."""
+        return self.count, self.lastUsed
+
+
+# Bounded index of played tracks which evicts the least played ones and matches queries by trigram or word prefix
+class AutocompleteIndex:
+    def __init__(self, maxEntries: int, indexed: bool = True) -> None:
+        self.maxEntries = maxEntries
+        # Small indexes are cheaper to scan than to index
+        self.indexed = indexed
+        self.entries: Dict[str, HistoryEntry] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        # Empty and very short queries match a large share of the entries so their rankings are kept until the next play
+        self._shortResults: Dict[Tuple[str, int], List[HistoryEntry]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _grams(self, text: str) -> Iterable[Tuple[Dict[str, Set[str]], str]]:
+        """Gets every index key for a piece of text along with the index it belongs in."""
+        yield from ((self._trigrams, gram) for gram in trigrams(text))
+        yield from ((self._prefixes, prefix) for prefix in wordPrefixes(text))
+
+    def record(self, uri: str, label: str, text: str, track: Optional[Tuple[type, str, Dict[str, Any]]] = None) -> None:
+        """
+        Records a play of a track.
+
+        Parameters
+        ----------
+        uri: str
+            The track's URI which is used as the autocomplete value.
+        label: str
+            The text shown to the user.
+        text: str
+            The normalized text to match queries against.
+        track: Optional[Tuple[type, str, Dict[str, Any]]]
+            The track's class, ID and info so it can be rebuilt without searching again.
+        """
+        self._shortResults.clear()
+        entry = self.entries.get(uri)
+        if entry is not None:
+            entry.count += 1
+            entry.lastUsed = time.monotonic()
+            if track is not None:
+                entry.track = track
+            return
+        if len(self.entries) >= self.maxEntries:
+            self._evict()
+        entry = self.entries[uri] = HistoryEntry(uri, label, text, track)
+        if self.indexed:
+            for index, key in self._grams(text):
+                index.setdefault(key, set()).add(uri)
+
+    def _evict(self) -> None:
+        """Removes the least played tenth of the entries and halves every count so old favourites don't stay forever."""
+        for entry in heapq.nsmallest(max(1, self.maxEntries//10), self.entries.values(), key=HistoryEntry.rank):
+            del self.entries[entry.uri]
+            if self.indexed:
+                for index, key in self._grams(entry.text):
+                    uris = index[key]
+                    uris.discard(entry.uri)
+                    if not uris:
+                        del index[key]
+        for entry in self.entries.values():
+            entry.count = (entry.count+1)//2
+
+    def search(self, query: str, limit: int = maxChoices) -> List[HistoryEntry]:
+        """
+        Finds the most played entries matching a query.
+
+        Parameters
+        ----------
+        query: str
+            The normalized text typed so far. Short queries match the start of words and longer ones match anywhere.
+        limit: int
+            The maximum amount of entries to return.
+
+        Returns
+        -------
+        List[HistoryEntry]
+            The matching entries, most played first.
+        """
+        short = len(query) < 3
+        if short and (query, limit) in self._shortResults:
+            return self._shortResults[query, limit]
+        if not query:
+            candidates = self.entries.values()
+        elif not self.indexed:
+            if len(query) < 3:
+                candidates = [entry for entry in self.entries.values() if query in wordPrefixes(entry.text) or entry.text.startswith(query)]
+            else:
+                candidates = [entry for entry in self.entries.values() if query in entry.text]
+        elif len(query) < 3:
+            candidates = [self.entries[uri] for uri in self._prefixes.get(query, ())]
+        else:
+            # Intersect the smallest sets first and then check the trigrams actually appear in order
+            sets = sorted((self._trigrams.get(gram, set()) for gram in trigrams(query)), key=len)
+            uris = sets[0].intersection(*sets[1:]) if sets[0] else set()
+            candidates = [self.entries[uri] for uri in uris if query in self.entries[uri].text]
+        results = heapq.nlargest(limit, candidates, key=HistoryEntry.rank)
+        if short:
+            self._shortResults[query, limit] = results
+        return results
+
+
+# Remembers what has been played globally and in each guild to suggest /play queries without searching
+class PlayHistory:
+    def __init__(self, maxGlobal: int = 5000, maxPerGuild: int = 200, maxGuilds: int = 1000) -> None:
+        self.maxPerGuild = maxPerGuild
+        self.maxGuilds = maxGuilds
+        self.globalIndex = AutocompleteIndex(maxGlobal)
+        self._guilds: "OrderedDict[int, AutocompleteIndex]" = OrderedDict()
+
+    def record(self, guildId: int, track: Any) -> None:
+        """
+        Records that a track was played in a guild.
+
+        Parameters
+        ----------
+        guildId: int
+            The ID of the guild.
+        track: Any
+            The lavapy track which was played.
+        """
+        # Suggestions are only a convenience so a failure here must never stop a track from playing
+        try:
+            self._record(guildId, track)
+        except Exception:
+            logger.exception("Failed to record a played track")
+
+    def _record(self, guildId: int, track: Any) -> None:
+        uri = getattr(track, "uri", None)
+        if not uri or len(uri) > maxChoiceLength:
+            return
+        label = f"{track.title} - {track.author}"
+        if len(label) > maxChoiceLength:
+            label = f"{label[:maxChoiceLength-3]}..."
+        text = normalize(f"{track.title} {track.author} {uri}")
+        self.globalIndex.record(uri, label, text, (type(track), track.id, TrackStore.trackInfo(track)))
+        guild = self._guilds.get(guildId)
+        if guild is None:
+            guild = self._guilds[guildId] = AutocompleteIndex(self.maxPerGuild, indexed=False)
+            if len(self._guilds) > self.maxGuilds:
+                self._guilds.popitem(last=False)
+        else:
+            self._guilds.move_to_end(guildId)
+        guild.record(uri, label, text)
+
+    def suggest(self, guildId: Optional[int], query: str, limit: int = maxChoices) -> List[Tuple[str, str]]:
+        """
+        Suggests previously played tracks for a partially typed query, preferring ones played in the same guild.
+
+        Parameters
+        ----------
+        guildId: Optional[int]
+            The ID of the guild the query is being typed in.
+        query: str
+            The text typed so far.
+        limit: int
+            The maximum amount of suggestions.
+
+        Returns
+        -------
+        List[Tuple[str, str]]
+            The label and URI of each suggestion.
+        """
+        query = normalize(query)
+        suggestions: Dict[str, str] = {}
+        guild = self._guilds.get(guildId)
+        for index in ((guild, self.globalIndex) if guild is not None else (self.globalIndex,)):
+            for entry in index.search(query, limit):
+                if len(suggestions) >= limit:
+                    break
+                suggestions.setdefault(entry.uri, entry.label)
+        return [(label, uri) for uri, label in suggestions.items()]
+
+    def knownTrack(self, uri: str) -> Optional[Any]:
+        """
+        Rebuilds a previously played track from its URI without searching for it.
+
+        Parameters
+        ----------
+        uri: str
+            The track's URI.
+
+        Returns
+        -------
+        Optional[Any]
+            A new copy of the track or None if it isn't known.
+        """
+        entry = self.globalIndex.entries.get(uri.strip())
+        if entry is None or entry.track is None:
+            return None
+        trackClass, trackId, info = entry.track
+        # A new object each time since the queue tells entries apart by identity
+        return trackClass(trackId, info)
@@ -0,0 +1,147 @@
+# Builtin
+import asyncio
+import logging
+from math import ceil
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+# Custom
+from Utils.Metrics import metrics
+
+if TYPE_CHECKING:
+    from Cogs.Music import CustomPlayer
+
+logger = logging.getLogger(__name__)
+
+
+# Hashed timer wheel which schedules and cancels timers in O(1) and expires them in batches on each tick
+class TimerWheel:
+    def __init__(self, tick: float = 5, slots: int = 720) -> None:
+        self.tick = tick
+        self.slots = slots
+        # Each slot maps its keys to the amount of full turns left before they expire
+        self._wheel: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._slotOf: Dict[Hashable, int] = {}
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        return len(self._slotOf)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slotOf
+
+    def schedule(self, key: Hashable, delay: float) -> None:
+        """Starts or restarts a key's timer so it expires after a given amount of seconds."""
+        self.cancel(key)
+        ticks = max(1, ceil(delay/self.tick))
+        slot = (self._cursor+ticks) % self.slots
+        self._wheel[slot][key] = (ticks-1)//self.slots
+        self._slotOf[key] = slot
+
+    def cancel(self, key: Hashable) -> None:
+        """Stops a key's timer if it has one."""
+        slot = self._slotOf.pop(key, None)
+        if slot is not None:
+            del self._wheel[slot][key]
+
+    def advance(self) -> List[Hashable]:
+        """Moves the wheel on by one tick and returns the keys which expired."""
+        self._cursor = (self._cursor+1) % self.slots
+        bucket = self._wheel[self._cursor]
+        expired = [key for key, turns in bucket.items() if not turns]
+        for key in expired:
+            del bucket[key]
+            del self._slotOf[key]
+        for key in bucket:
+            bucket[key] -= 1
+        return expired
+
+
+# Disconnects players which have been idle, paused or alone in their channel for too long
+class PlayerReaper:
+    def __init__(self, timeouts: Dict[str, Optional[float]], tick: float = 5) -> None:
+        self.timeouts = timeouts
+        self.reap: Optional[Callable[["CustomPlayer", str], Awaitable[None]]] = None
+        self.reaped: Dict[str, int] = {reason: 0 for reason in timeouts}
+        self._wheel = TimerWheel(tick)
+        self._players: Dict[int, "CustomPlayer"] = {}
+        self._reasons: Dict[int, str] = {}
+        self._tickTask: Optional[asyncio.Task] = None
+        self._reapTasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._wheel)
+
+    @staticmethod
+    def reason(player: "CustomPlayer") -> Optional[str]:
+        """
+        Works out why a player should be reaped.
+
+        Parameters
+        ----------
+        player: CustomPlayer
+            The player to check.
+
+        Returns
+        -------
+        Optional[str]
+            'alone' if nobody else is in the channel, 'paused' if it is paused, 'idle' if nothing is playing or None if it is in use.
+        """
+        if player.channel is not None and not any(not member.bot for member in player.channel.members):
+            return "alone"
+        if player.isPaused:
+            return "paused"
+        if not player.isPlaying:
+            return "idle"
+        return None
+
+    def update(self, player: "CustomPlayer") -> None:
+        """Starts, restarts or stops a player's timer after its state or its channel has changed."""
+        guildId = player.guild.id
+        reason = self.reason(player)
+        # Keep the existing timer running if the player is still unused for the same reason
+        if reason == self._reasons.get(guildId) and guildId in self._wheel:
+            return
+        timeout = self.timeouts.get(reason) if reason is not None else None
+        if timeout is None:
+            self.remove(player)
+            return
+        self._players[guildId] = player
+        self._reasons[guildId] = reason
+        self._wheel.schedule(guildId, timeout)
+
+    def remove(self, player: "CustomPlayer") -> None:
+        """Stops tracking a player."""
+        guildId = player.guild.id
+        self._wheel.cancel(guildId)
+        self._players.pop(guildId, None)
+        self._reasons.pop(guildId, None)
+
+    def _expire(self, guildId: int) -> None:
+        """Reaps a player whose timer ran out if it is still unused for the same reason."""
+        player = self._players.pop(guildId)
+        reason = self._reasons.pop(guildId)
+        if self.reason(player) != reason:
+            self.update(player)
+            return
+        self.reaped[reason] += 1
+        metrics.increment("music_players_reaped_total", reason=reason)
+        task = asyncio.create_task(self.reap(player, reason))
+        self._reapTasks.add(task)
+        task.add_done_callback(self._reapDone)
+
+    def _reapDone(self, task: asyncio.Task) -> None:
+        self._reapTasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to reap a player", exc_info=task.exception())
+
+    def start(self, reap: Callable[["CustomPlayer", str], Awaitable[None]]) -> None:
+        """Starts turning the timer wheel, calling a given coroutine function with each player to reap and the reason why."""
+        self.reap = reap
+
+        async def tickLoop() -> None:
+            while True:
+                await asyncio.sleep(self._wheel.tick)
+                for guildId in self._wheel.advance():
+                    self._expire(guildId)
+
+        if self._tickTask is None:
+            self._tickTask = asyncio.create_task(tickLoop())
@@ -0,0 +1,175 @@
+# Builtin
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+# Custom
+from Utils.SQLiteWorker import SQLiteWorker
+
+if TYPE_CHECKING:
+    from Cogs.Music import CustomPlayer
+
+logger = logging.getLogger(__name__)
+
+
+# Periodically saves the state of every player to SQLite so it can be resumed after a restart
+class PlayerStateStore:
+    def __init__(self, path: Path, interval: float = 15) -> None:
+        self.path = path
+        self.interval = interval
+        self._connection: Optional[sqlite3.Connection] = None
+        self._worker = SQLiteWorker("PlayerStateStore")
+        self._queueVersions: Dict[int, int] = {}
+        self._snapshotTask: Optional[asyncio.Task] = None
+
+    def _open(self) -> None:
+        """Opens the database and creates the table if needed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS players (guildId INTEGER PRIMARY KEY, voiceChannelId INTEGER NOT NULL, "
+                                 "textChannelId INTEGER, queue TEXT NOT NULL, current INTEGER NOT NULL, position REAL NOT NULL, "
+                                 "volume INTEGER NOT NULL, repeating INTEGER NOT NULL, updated REAL NOT NULL)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS reaped (guildId INTEGER PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)")
+        self._connection.commit()
+
+    def _write(self, states: List[Dict[str, Any]], removed: List[int]) -> None:
+        """Writes a batch of player states, only replacing the stored queue for players whose queue changed."""
+        now = time.time()
+        for state in states:
+            values = (state["voiceChannelId"], state["textChannelId"], state["current"], state["position"], state["volume"], int(state["repeating"]), now)
+            if "queue" in state:
+                self._connection.execute("INSERT OR REPLACE INTO players (voiceChannelId, textChannelId, current, position, volume, repeating, updated, queue, guildId) "
+                                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values+(json.dumps(state["queue"]), state["guildId"]))
+            else:
+                self._connection.execute("UPDATE players SET voiceChannelId = ?, textChannelId = ?, current = ?, position = ?, volume = ?, repeating = ?, "
+                                         "updated = ? WHERE guildId = ?", values+(state["guildId"],))
+        self._connection.executemany("DELETE FROM players WHERE guildId = ?", [(guildId,) for guildId in removed])
+        self._connection.commit()
+
+    def _writeReaped(self, state: Dict[str, Any]) -> None:
+        """Writes the state of a player which was disconnected for being unused."""
+        self._connection.execute("INSERT OR REPLACE INTO reaped (guildId, state, updated) VALUES (?, ?, ?)", (state["guildId"], json.dumps(state), time.time()))
+        self._connection.commit()
+
+    def _popReaped(self, guildId: int) -> Optional[str]:
+        """Reads and deletes the state of a player which was disconnected for being unused."""
+        row = self._connection.execute("SELECT state FROM reaped WHERE guildId = ?", (guildId,)).fetchone()
+        self._connection.execute("DELETE FROM reaped WHERE guildId = ?", (guildId,))
+        self._connection.commit()
+        return row[0] if row else None
+
+    def _readAll(self) -> List[Tuple[Any, ...]]:
+        """Reads every stored player state."""
+        return self._connection.execute("SELECT guildId, voiceChannelId, textChannelId, queue, current, position, volume, repeating FROM players").fetchall()
+
+    async def open(self) -> None:
+        """Opens the store."""
+        await self._worker.run(self._open)
+
+    def start(self, getPlayers: Callable[[], Iterable["CustomPlayer"]]) -> None:
+        """Starts periodically saving the state of every player."""
+        async def snapshotLoop() -> None:
+            while True:
+                await asyncio.sleep(self.interval)
+                # One bad snapshot mustn't stop every later one from being saved
+                try:
+                    await self.save(list(getPlayers()))
+                except Exception:
+                    logger.exception("Failed to save the player states")
+
+        if self._snapshotTask is None:
+            self._snapshotTask = asyncio.create_task(snapshotLoop())
+
+    async def save(self, players: List["CustomPlayer"], removed: Optional[List[int]] = None) -> None:
+        """
+        Saves the state of a group of players in one batch.
+
+        Parameters
+        ----------
+        players: List[CustomPlayer]
+            The players to save.
+        removed: Optional[List[int]]
+            The IDs of guilds whose saved state should be deleted.
+        """
+        if self._connection is None:
+            return
+        states = []
+        for player in players:
+            # Only serialize the queue again if it has changed since the last snapshot
+            includeQueue = self._queueVersions.get(player.guild.id) != player.queueVersion
+            state = player.snapshotState(includeQueue)
+            if state is None:
+                continue
+            if includeQueue:
+                self._queueVersions[player.guild.id] = player.queueVersion
+            states.append(state)
+        removed = removed or []
+        for guildId in removed:
+            self._queueVersions.pop(guildId, None)
+        if states or removed:
+            await self._worker.run(self._write, states, removed)
+
+    async def discard(self, guildId: int) -> None:
+        """Deletes a guild's saved state once its player has intentionally stopped."""
+        await self.save([], [guildId])
+
+    async def saveReaped(self, state: Dict[str, Any]) -> None:
+        """Keeps the state of a player which is about to be disconnected for being unused so it can be restored on request."""
+        if self._connection is not None:
+            await self._worker.run(self._writeReaped, state)
+
+    async def popReaped(self, guildId: int) -> Optional[Dict[str, Any]]:
+        """
+        Takes the state of a guild's player which was disconnected for being unused.
+
+        Parameters
+        ----------
+        guildId: int
+            The ID of the guild.
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            The saved state or None if there isn't one.
+        """
+        if self._connection is None:
+            return None
+        state = await self._worker.run(self._popReaped, guildId)
+        return json.loads(state) if state is not None else None
+
+    async def load(self) -> List[Dict[str, Any]]:
+        """
+        Loads every saved player state.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The saved states.
+        """
+        if self._connection is None:
+            return []
+        rows = await self._worker.run(self._readAll)
+        return [{"guildId": guildId,
+                 "voiceChannelId": voiceChannelId,
+                 "textChannelId": textChannelId,
+                 "queue": json.loads(queue),
+                 "current": current,
+                 "position": position,
+                 "volume": volume,
+                 "repeating": bool(repeating)} for guildId, voiceChannelId, textChannelId, queue, current, position, volume, repeating in rows]
+
+    async def close(self, players: Optional[List["CustomPlayer"]] = None) -> None:
+        """Saves the state of any given players one last time and closes the store."""
+        if self._snapshotTask is not None:
+            self._snapshotTask.cancel()
+            self._snapshotTask = None
+        if self._connection is not None:
+            if players:
+                await self.save(players)
+            await self._worker.run(self._connection.close)
+            self._connection = None
+        self._worker.shutdown()
@@ -0,0 +1,112 @@
+# Builtin
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+# Pip
+import lavapy
+
+
+# Token bucket shared between players to limit how fast partial tracks are resolved
+class RateLimiter:
+    def __init__(self, rate: int, per: float) -> None:
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and then takes it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens+(now-self._updated)*self.rate/self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1-self._tokens)*self.per/self.rate)
+
+
+# Resolves upcoming partial tracks in the background so they are ready before they need to be played
+class Prefetcher:
+    def __init__(self,
+                 resolve: Callable[[lavapy.PartialResource], Awaitable[Any]],
+                 rateLimiter: RateLimiter,
+                 lookahead: int = 5,
+                 concurrency: int = 2
+                 ) -> None:
+        self.resolve = resolve
+        self.rateLimiter = rateLimiter
+        self.lookahead = lookahead
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Both dictionaries are keyed by the partial's id and keep a reference to it so the id can't be reused
+        self._resolved: Dict[int, Tuple[lavapy.PartialResource, lavapy.Track]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._resolved)
+
+    def substitute(self, track: Any) -> Any:
+        """Returns the resolved version of a track if there is one."""
+        resolved = self._resolved.get(id(track))
+        return resolved[1] if resolved else track
+
+    def pop(self, track: Any) -> Any:
+        """Returns the resolved version of a track if there is one and stops storing it."""
+        resolved = self._resolved.pop(id(track), None)
+        return resolved[1] if resolved else track
+
+    def schedule(self,
+                 tracks: List[Any],
+                 start: int,
+                 onResolved: Callable[[int, lavapy.PartialResource, lavapy.Track], None]
+                 ) -> None:
+        """
+        Starts resolving the partial tracks which come after a given position.
+
+        Parameters
+        ----------
+        tracks: List[Any]
+            The player's queue.
+        start: int
+            The position of the current track.
+        onResolved: Callable[[int, lavapy.PartialResource, lavapy.Track], None]
+            Called with the index, the partial track and the resolved track once each partial is resolved.
+        """
+        for index in range(start+1, min(start+1+self.lookahead, len(tracks))):
+            track = tracks[index]
+            if isinstance(track, lavapy.PartialResource) and id(track) not in self._resolved and id(track) not in self._tasks:
+                self._tasks[id(track)] = asyncio.create_task(self._prefetch(index, track, onResolved))
+
+    async def _prefetch(self,
+                        index: int,
+                        partial: lavapy.PartialResource,
+                        onResolved: Callable[[int, lavapy.PartialResource, lavapy.Track], None]
+                        ) -> None:
+        """Resolves a single partial track."""
+        try:
+            async with self._semaphore:
+                await self.rateLimiter.acquire()
+                resolved = await self.resolve(partial)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Leave the track partial so it gets resolved normally when it is played
+            return
+        finally:
+            self._tasks.pop(id(partial), None)
+        if isinstance(resolved, lavapy.Track):
+            self._resolved[id(partial)] = (partial, resolved)
+            onResolved(index, partial, resolved)
+
+    def cancel(self) -> None:
+        """Cancels every in-progress resolve."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    def clear(self) -> None:
+        """Cancels every in-progress resolve and forgets every resolved track."""
+        self.cancel()
+        self._resolved.clear()
@@ -0,0 +1,19 @@
+# Builtin
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+# Runs the database calls for a SQLite connection without blocking the event loop. A single worker means the connection
+# is only ever used from one thread
+class SQLiteWorker:
+    def __init__(self, name: str) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Runs a database function on the worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def shutdown(self) -> None:
+        """Stops the worker thread once any queued calls have finished."""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,229 @@
+# Builtin
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+# Pip
+import lavapy
+
+if TYPE_CHECKING:
+    from Utils.TrackStore import TrackStore
+
+# Matches any run of whitespace so search terms can be normalized
+whitespaceRegex = re.compile(r"\s+")
+
+
+# Caches search results so repeated queries don't go back to Lavalink or Spotify
+class SearchCache:
+    def __init__(self, maxSize: int = 1024, ttl: float = 600, negativeTtl: float = 30, store: Optional["TrackStore"] = None) -> None:
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.negativeTtl = negativeTtl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.storeHits = 0
+        self.store = store
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inFlight: Dict[Hashable, asyncio.Future] = {}
+        # Maps the key a partial track is resolved under to the search which returned it
+        self._partialSearches: "OrderedDict[Hashable, Hashable]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Returns the cache's hit, miss and coalesced request counters."""
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "storeHits": self.storeHits, "size": len(self._entries)}
+
+    @staticmethod
+    def normalizeQuery(query: str) -> str:
+        """
+        Normalizes a query so equivalent searches share a cache entry.
+
+        Parameters
+        ----------
+        query: str
+            The query to normalize.
+
+        Returns
+        -------
+        str
+            The normalized query. URLs keep their case since IDs in them are case-sensitive.
+        """
+        query = query.strip()
+        if query.startswith(("http://", "https://")):
+            return query
+        return whitespaceRegex.sub(" ", query).casefold()
+
+    @classmethod
+    def makeKey(cls, searchType: Any, query: str, **kwargs) -> Hashable:
+        """Creates the cache key for a given search type, query and search options."""
+        return getattr(searchType, "__qualname__", repr(searchType)), cls.normalizeQuery(query), tuple(sorted(kwargs.items()))
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Gets a cached result if it hasn't expired.
+
+        Parameters
+        ----------
+        key: Hashable
+            The key to look up.
+
+        Returns
+        -------
+        Tuple[bool, Any]
+            Whether the key was found and the cached result (which may be None for a negative entry).
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expiry, result = entry
+        if expiry < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, result
+
+    def put(self, key: Hashable, result: Any) -> None:
+        """Stores a result, evicting the least recently used entries if the cache is full."""
+        ttl = self.ttl if result is not None else self.negativeTtl
+        self._entries[key] = (time.monotonic()+ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def copyResult(result: Any) -> Any:
+        """
+        Copies a cached result so callers can't change it for everyone else.
+
+        Parameters
+        ----------
+        result: Any
+            The cached result.
+
+        Returns
+        -------
+        Any
+            A shallow copy for playlists and albums since playing them pops tracks off their list, otherwise the result itself.
+        """
+        if isinstance(result, lavapy.MultiTrack):
+            return type(result)(result.name, list(result.tracks))
+        return result
+
+    def clear(self) -> None:
+        """Removes every cached result."""
+        self._entries.clear()
+
+    async def search(self, searchType: Any, query: str, **kwargs) -> Optional[Any]:
+        """
+        Searches for a query, returning a cached result if possible.
+
+        Identical searches which are already in progress are coalesced into a single request.
+
+        Parameters
+        ----------
+        searchType: Any
+            The lavapy track type to search with.
+        query: str
+            The query to search for.
+        kwargs
+            Any extra options to pass to the search.
+
+        Returns
+        -------
+        Optional[Any]
+            The search result or None if nothing was found.
+        """
+        return await self._cached(self.makeKey(searchType, query, **kwargs), lambda: searchType.search(query, **kwargs))
+
+    @staticmethod
+    async def fetchPartial(node: lavapy.Node, partial: lavapy.PartialResource) -> Optional[Any]:
+        """
+        Resolves a partial track with the same Lavalink request lavapy makes when playing one.
+
+        Parameters
+        ----------
+        node: lavapy.Node
+            The node to send the request to.
+        partial: lavapy.PartialResource
+            The partial track to resolve. Its query already has the search prefix so it is passed on as is.
+
+        Returns
+        -------
+        Optional[Any]
+            The first matching track, a playlist or None if nothing was found.
+        """
+        result = await node.getTracks(partial.cls, partial.query)
+        if isinstance(result, list):
+            return result[0] if result else None
+        return result
+
+    async def resolve(self, node: lavapy.Node, partial: lavapy.PartialResource) -> Optional[Any]:
+        """
+        Resolves a partial track, returning a cached result if possible.
+
+        Parameters
+        ----------
+        node: lavapy.Node
+            The node to send the request to if the result isn't cached.
+        partial: lavapy.PartialResource
+            The partial track to resolve.
+
+        Returns
+        -------
+        Optional[Any]
+            The resolved track or None if nothing was found.
+        """
+        return await self._cached(self.makeKey(partial.cls, partial.query), lambda: self.fetchPartial(node, partial))
+
+    async def _cached(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        """Gets the result for a key from the cache, an identical request in progress or by fetching it."""
+        found, result = self.get(key)
+        if found:
+            self.hits += 1
+            return self.copyResult(result)
+        inFlight = self._inFlight.get(key)
+        if inFlight is not None:
+            self.coalesced += 1
+            return self.copyResult(await asyncio.shield(inFlight))
+        self.misses += 1
+        # Run the search as a task so a cancelled caller doesn't cancel it for everyone else
+        task = asyncio.ensure_future(self._lookup(key, fetch))
+        self._inFlight[key] = task
+        task.add_done_callback(lambda finished: self._searchDone(key, finished))
+        return self.copyResult(await asyncio.shield(task))
+
+    async def _lookup(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        """Looks up a result in the persistent store before falling back to an actual search."""
+        if self.store is not None:
+            result = await self.store.get(key)
+            if result is not None:
+                self.storeHits += 1
+                return result
+        return await fetch()
+
+    def _searchDone(self, key: Hashable, task: asyncio.Future) -> None:
+        """Caches the result of a finished search and stops coalescing requests onto it."""
+        self._inFlight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        self._save(key, result)
+        if isinstance(result, lavapy.PartialResource):
+            self._partialSearches[self.makeKey(result.cls, result.query)] = key
+            while len(self._partialSearches) > self.maxSize:
+                self._partialSearches.popitem(last=False)
+        elif result is not None and key in self._partialSearches:
+            # Searches mostly return partial tracks so the search is saved again with the resolved track once it is
+            # played, letting later searches and restarts skip resolving it
+            self._save(self._partialSearches.pop(key), result)
+
+    def _save(self, key: Hashable, result: Any) -> None:
+        """Stores a result in the cache and the persistent store."""
+        self.put(key, result)
+        if self.store is not None and result is not None:
+            self.store.put(key, result)
@@ -0,0 +1,217 @@
+# Builtin
+import asyncio
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+# Pip
+import lavapy
+from lavapy.ext import spotify
+# Custom
+from Utils.CompactQueue import CompactTrack
+from Utils.SQLiteWorker import SQLiteWorker
+
+
+# Persists resolved search results to SQLite so they survive restarts
+class TrackStore:
+    def __init__(self, path: Path, maxEntries: int = 50000, flushInterval: float = 5) -> None:
+        self.path = path
+        self.maxEntries = maxEntries
+        self.flushInterval = flushInterval
+        self._pending: Dict[str, str] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._worker = SQLiteWorker("TrackStore")
+        self._flushTask: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def encodeKey(key: Hashable) -> str:
+        """Converts a search cache key into a string which can be stored."""
+        return json.dumps(key)
+
+    @staticmethod
+    def decodeKey(key: str) -> Hashable:
+        """Converts a stored string back into a search cache key."""
+        searchType, query, options = json.loads(key)
+        return searchType, query, tuple(tuple(option) for option in options)
+
+    @staticmethod
+    def _trackClass(name: str) -> type:
+        """Finds the lavapy class with a given name, defaulting to the base track class."""
+        return getattr(lavapy, name, None) or getattr(spotify, name, None) or lavapy.Track
+
+    @staticmethod
+    def trackInfo(track: lavapy.Track) -> Dict[str, Any]:
+        """
+        Rebuilds the info dictionary a track was created from since lavapy doesn't expose it.
+
+        Parameters
+        ----------
+        track: lavapy.Track
+            The track to get the info for.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The info in the form lavapy's Track expects.
+        """
+        return {"identifier": track.identifier,
+                "isSeekable": track.isSeekable,
+                "author": track.author,
+                "length": track.length,
+                "isStream": track.isStream,
+                "sourceName": track.type,
+                "title": track.title,
+                "uri": track.uri}
+
+    @classmethod
+    def serialize(cls, result: Any) -> Optional[Dict[str, Any]]:
+        """
+        Converts a search result into a JSON serializable dictionary.
+
+        Parameters
+        ----------
+        result: Any
+            The search result to convert.
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            The serialized result or None if the result can't be stored.
+        """
+        if isinstance(result, lavapy.MultiTrack):
+            tracks = [cls.serialize(track) for track in result.tracks]
+            if None in tracks:
+                return None
+            return {"type": "multi", "class": type(result).__name__, "name": result.name, "tracks": tracks}
+        elif isinstance(result, lavapy.PartialResource):
+            return {"type": "partial", "class": result.cls.__name__, "query": result.query}
+        elif isinstance(result, lavapy.Track):
+            return {"type": "track", "class": type(result).__name__, "id": result.id, "info": cls.trackInfo(result)}
+        elif isinstance(result, CompactTrack):
+            return cls.serialize(result.materialize())
+        return None
+
+    @classmethod
+    def deserialize(cls, data: Dict[str, Any]) -> Any:
+        """
+        Converts a serialized dictionary back into a search result.
+
+        Parameters
+        ----------
+        data: Dict[str, Any]
+            The serialized result.
+
+        Returns
+        -------
+        Any
+            The search result.
+        """
+        if data["type"] == "multi":
+            multiClass = getattr(lavapy, data["class"], None) or getattr(spotify, data["class"], None) or lavapy.MultiTrack
+            return multiClass(data["name"], [cls.deserialize(track) for track in data["tracks"]])
+        elif data["type"] == "partial":
+            return lavapy.PartialResource(cls._trackClass(data["class"]), data["query"])
+        return cls._trackClass(data["class"])(data["id"], data["info"])
+
+    def _open(self) -> None:
+        """Opens the database and creates the table if needed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS tracks (key TEXT PRIMARY KEY, data TEXT NOT NULL, hits INTEGER NOT NULL DEFAULT 1, lastUsed REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS tracksHits ON tracks (hits, lastUsed)")
+        self._connection.commit()
+
+    def _read(self, key: str) -> Optional[str]:
+        """Reads a single entry from the database."""
+        row = self._connection.execute("SELECT data FROM tracks WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _readHottest(self, amount: int) -> List[Tuple[str, str]]:
+        """Reads the most used entries from the database."""
+        return self._connection.execute("SELECT key, data FROM tracks ORDER BY hits DESC, lastUsed DESC LIMIT ?", (amount,)).fetchall()
+
+    def _write(self, batch: Dict[str, str]) -> None:
+        """Writes a batch of entries to the database and evicts the least used ones if it is too big."""
+        now = time.time()
+        self._connection.executemany("INSERT INTO tracks (key, data, lastUsed) VALUES (?, ?, ?) "
+                                     "ON CONFLICT(key) DO UPDATE SET data = excluded.data, hits = hits + 1, lastUsed = excluded.lastUsed",
+                                     [(key, data, now) for key, data in batch.items()])
+        self._connection.execute("DELETE FROM tracks WHERE key IN (SELECT key FROM tracks ORDER BY hits DESC, lastUsed DESC LIMIT -1 OFFSET ?)",
+                                 (self.maxEntries,))
+        self._connection.commit()
+
+    async def _flushLoop(self) -> None:
+        """Periodically writes the pending entries to the database."""
+        while True:
+            await asyncio.sleep(self.flushInterval)
+            await self.flush()
+
+    async def open(self) -> None:
+        """Opens the store and starts the background writer."""
+        await self._worker.run(self._open)
+        self._flushTask = asyncio.create_task(self._flushLoop())
+
+    async def close(self) -> None:
+        """Writes any pending entries and closes the store."""
+        if self._flushTask is not None:
+            self._flushTask.cancel()
+            self._flushTask = None
+        if self._connection is not None:
+            await self.flush()
+            await self._worker.run(self._connection.close)
+            self._connection = None
+        self._worker.shutdown()
+
+    async def flush(self) -> None:
+        """Writes the pending entries to the database in one batch."""
+        if not self._pending or self._connection is None:
+            return
+        batch, self._pending = self._pending, {}
+        await self._worker.run(self._write, batch)
+
+    def put(self, key: Hashable, result: Any) -> None:
+        """Queues a search result to be written in the next batch."""
+        data = self.serialize(result)
+        if data is not None:
+            self._pending[self.encodeKey(key)] = json.dumps(data)
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Gets a stored search result.
+
+        Parameters
+        ----------
+        key: Hashable
+            The search cache key to look up.
+
+        Returns
+        -------
+        Optional[Any]
+            The search result or None if it isn't stored.
+        """
+        encodedKey = self.encodeKey(key)
+        data = self._pending.get(encodedKey)
+        if data is None and self._connection is not None:
+            data = await self._worker.run(self._read, encodedKey)
+        return self.deserialize(json.loads(data)) if data is not None else None
+
+    async def hottest(self, amount: int) -> List[Tuple[Hashable, Any]]:
+        """
+        Gets the most used search results so they can be preloaded.
+
+        Parameters
+        ----------
+        amount: int
+            The maximum amount of results to get.
+
+        Returns
+        -------
+        List[Tuple[Hashable, Any]]
+            The search cache keys and their results.
+        """
+        if self._connection is None:
+            return []
+        rows = await self._worker.run(self._readHottest, amount)
+        return [(self.decodeKey(key), self.deserialize(json.loads(data))) for key, data in rows]
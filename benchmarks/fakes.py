@@ -0,0 +1,235 @@
+# Builtin
+import asyncio
+import random
+from typing import Any, Dict, List, Optional
+# Pip
+import discord
+import lavapy
+# Custom
+from Cogs.Music import CustomPlayer, Prefetcher, QueueView, prefetchRateLimiter
+
+
+def makeTrack(number: int) -> lavapy.Track:
+    """Creates a real lavapy track from synthetic track info so no Lavalink server is needed."""
+    info = {"identifier": f"track{number}",
+            "isSeekable": True,
+            "author": f"Author {number % 500}",
+            "length": 180000+number,
+            "isStream": False,
+            "position": 0,
+            "sourceName": "youtube",
+            "title": f"Benchmark Track Number {number} (Official Audio)",
+            "uri": f"https://www.youtube.com/watch?v=track{number}"}
+    return lavapy.YoutubeTrack(f"QAAAjQIAJFJpY2sgQXN0bGV5IC0gTmV2ZXIgR29ubmEgR2l2ZSBZb3UgVXA{number}", info)
+
+
+def makeTracks(amount: int, partialEvery: int = 0) -> List[Any]:
+    """Creates a list of fake tracks where every nth one is a partial resource."""
+    return [lavapy.PartialResource(lavapy.YoutubeTrack, f"benchmark query {number}") if partialEvery and number % partialEvery == 0 else makeTrack(number)
+            for number in range(amount)]
+
+
+def makeMultiTrack(amount: int) -> lavapy.MultiTrack:
+    """Creates a playlist of fake tracks."""
+    return lavapy.MultiTrack("Benchmark Playlist", makeTracks(amount, partialEvery=3))
+
+
+# Queue with the same interface lavapy's queue exposes to the Music cog
+class FakeQueue:
+    def __init__(self) -> None:
+        self._tracks: List[Any] = []
+        self._position = 0
+
+    @property
+    def tracks(self) -> List[Any]:
+        if not self._tracks:
+            raise lavapy.QueueEmpty
+        return self._tracks
+
+    @property
+    def currentTrack(self) -> int:
+        return self._position
+
+    @property
+    def isEmpty(self) -> bool:
+        return self._position >= len(self._tracks)-1
+
+    def add(self, track: Any) -> None:
+        self._tracks.append(track)
+
+    def addIterable(self, tracks: List[Any]) -> None:
+        self._tracks.extend(tracks)
+
+    def next(self) -> Any:
+        if self.isEmpty:
+            raise lavapy.QueueEmpty
+        self._position += 1
+        return self._tracks[self._position]
+
+    def previous(self) -> Any:
+        if self._position <= 0:
+            raise lavapy.QueueEmpty
+        self._position -= 1
+        return self._tracks[self._position]
+
+    def replace(self, tracks: List[Any], position: int) -> None:
+        self._tracks = list(tracks)
+        self._position = position
+
+    def shuffle(self) -> None:
+        current = self._tracks.pop(self._position)
+        random.shuffle(self._tracks)
+        self._tracks.insert(self._position, current)
+
+
+# Stands in for lavapy's websocket so the node looks connected
+class StubWebsocket:
+    connected = True
+
+
+# Stands in for a Lavalink node by answering searches and player updates after a simulated round trip
+class StubNode:
+    def __init__(self, latency: float = 0.002, playlistSize: int = 100) -> None:
+        self.latency = latency
+        self.playlistSize = playlistSize
+        self.requests = 0
+        # The same attributes lavapy's Node has so the node balancer sees it as a real one
+        self._identifier = "Stub Node"
+        self._players: List[Any] = []
+        self._websocket = StubWebsocket()
+        self._stats = lavapy.Stats(self, {"uptime": 0,
+                                          "players": 0,
+                                          "playingPlayers": 0,
+                                          "memory": {"free": 0, "used": 0, "allocated": 0, "reservable": 0},
+                                          "cpu": {"cores": 4, "systemLoad": 0.1, "lavalinkLoad": 0.05},
+                                          "frameStats": {"sent": 0, "nulled": 0, "deficit": 0}})
+
+    @property
+    def identifier(self) -> str:
+        return self._identifier
+
+    @property
+    def players(self) -> List[Any]:
+        return self._players
+
+    @property
+    def stats(self) -> "lavapy.Stats":
+        return self._stats
+
+    async def roundTrip(self) -> None:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+
+    async def getTracks(self, cls: type, query: str) -> List[lavapy.Track]:
+        """Answers a Lavalink search the same way lavapy's Node.getTracks does."""
+        await self.roundTrip()
+        return [makeTrack(hash(query) % 100000)]
+
+    def searchType(self) -> type:
+        """Creates a search type whose searches are answered by this node."""
+        node = self
+
+        class StubSearch:
+            @classmethod
+            async def search(cls, query: str, partial: bool = False) -> Any:
+                # Like lavapy, partial searches don't contact Lavalink until the track is played
+                if partial and "playlist" not in query:
+                    return lavapy.PartialResource(cls, f"ytsearch:{query}")
+                await node.roundTrip()
+                if "playlist" in query:
+                    return makeMultiTrack(node.playlistSize)
+                return makeTrack(hash(query) % 100000)
+
+        return StubSearch
+
+
+# CustomPlayer which uses a fake queue and a stub node instead of connecting to voice and Lavalink
+class BenchmarkPlayer(CustomPlayer):
+    def __init__(self, node: StubNode, guildId: int) -> None:
+        # The voice and Lavalink setup done by lavapy is skipped on purpose
+        self.client = None
+        self.context = None
+        self.textChannel = None
+        self.searchCache = None
+        self.queueView = QueueView()
+        self.queueVersion = 0
+        self.prefetcher = Prefetcher(self.resolvePartial, prefetchRateLimiter)
+        self.stubNode = node
+        self.guildId = guildId
+        self.fakeQueue = FakeQueue()
+        self.currentTrack = None
+
+    @property
+    def queue(self) -> FakeQueue:
+        return self.fakeQueue
+
+    @property
+    def guild(self) -> discord.Object:
+        return discord.Object(id=self.guildId)
+
+    @property
+    def node(self) -> StubNode:
+        return self.stubNode
+
+    @property
+    def track(self) -> Any:
+        return self.currentTrack
+
+    @property
+    def isPlaying(self) -> bool:
+        return self.currentTrack is not None
+
+    @property
+    def isPaused(self) -> bool:
+        return False
+
+    async def play(self, track: Any, *args, **kwargs) -> None:
+        if isinstance(track, lavapy.PartialResource):
+            track = await self.resolvePartial(track)
+        await self.stubNode.roundTrip()
+        self.currentTrack = track
+
+
+# Application context which records responses instead of sending them to Discord
+class FakeContext:
+    def __init__(self, player: Any, user: Optional[discord.Object] = None) -> None:
+        self.voice_client = player
+        self.guild_id = player.guild.id
+        self.author = user or discord.Object(id=1)
+        self.responses: List[Dict[str, Any]] = []
+        self.interaction = FakeInteraction(self.author, self.guild_id)
+
+    async def respond(self, content: Any = None, **kwargs) -> None:
+        self.responses.append({"content": content, **kwargs})
+
+    async def defer(self, *args, **kwargs) -> None:
+        pass
+
+
+# Interaction whose responses are no-ops
+class FakeInteraction:
+    def __init__(self, user: discord.Object, guildId: Optional[int] = None) -> None:
+        self.user = user
+        self.guild_id = guildId
+        self.response = FakeInteractionResponse()
+        self.followup = self.response
+
+
+class FakeInteractionResponse:
+    def __init__(self) -> None:
+        self.edits = 0
+
+    def is_done(self) -> bool:
+        return False
+
+    async def send_message(self, *args, **kwargs) -> None:
+        pass
+
+    async def send(self, *args, **kwargs) -> None:
+        pass
+
+    async def edit_message(self, *args, **kwargs) -> None:
+        self.edits += 1
+
+    async def defer(self, *args, **kwargs) -> None:
+        pass
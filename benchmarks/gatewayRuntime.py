@@ -0,0 +1,136 @@
+"""Compares how many gateway events per second can be decoded and dispatched on the standard event loop and on uvloop.
+
+Both modes decode and encode with py-cord's own JSON functions, which use orjson by themselves whenever it is
+installed, so the only difference between them is the event loop.
+
+Payloads can be recorded from a running bot by enabling debug events and writing every raw message received in
+on_socket_raw_receive to a file, one per line. Without a recording, a synthetic mix of common events is used.
+
+Usage: python -m benchmarks.gatewayRuntime [--payloads recorded.jsonl] [--events 200000] [--output results.json]"""
+# Builtin
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+# Pip
+import discord
+# Custom
+from Utils.FastRuntime import newEventLoop, uvloop
+
+
+def makeMember(userId: int) -> Dict[str, Any]:
+    """Creates a guild member payload."""
+    return {"user": {"id": str(userId), "username": f"User {userId}", "discriminator": f"{userId % 10000:04}", "avatar": "a"*32, "public_flags": 0},
+            "roles": [str(900000+role) for role in range(userId % 5)],
+            "nick": None,
+            "joined_at": "2021-06-01T12:00:00.000000+00:00",
+            "deaf": False,
+            "mute": False}
+
+
+def syntheticPayloads(amount: int, seed: int = 0) -> List[str]:
+    """Creates a mix of gateway messages resembling what a music bot receives."""
+    random.seed(seed)
+    payloads = []
+    for sequence in range(amount):
+        guildId = str(random.randrange(10**17, 10**18))
+        kind = random.choices(["MESSAGE_CREATE", "PRESENCE_UPDATE", "VOICE_STATE_UPDATE", "INTERACTION_CREATE", "GUILD_CREATE"], [40, 30, 15, 14, 1])[0]
+        if kind == "MESSAGE_CREATE":
+            data = {"id": str(random.getrandbits(60)), "channel_id": str(random.getrandbits(60)), "guild_id": guildId, "author": makeMember(sequence)["user"],
+                    "member": makeMember(sequence), "content": "x"*random.randrange(10, 400), "timestamp": "2021-06-01T12:00:00.000000+00:00",
+                    "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}
+        elif kind == "PRESENCE_UPDATE":
+            data = {"user": {"id": str(sequence)}, "guild_id": guildId, "status": "online",
+                    "activities": [{"name": "Music", "type": 2, "created_at": 1622548800000, "details": "A song", "state": "An artist"}],
+                    "client_status": {"desktop": "online"}}
+        elif kind == "VOICE_STATE_UPDATE":
+            data = {"guild_id": guildId, "channel_id": str(random.getrandbits(60)), "user_id": str(sequence), "member": makeMember(sequence),
+                    "session_id": "s"*32, "deaf": False, "mute": False, "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False}
+        elif kind == "INTERACTION_CREATE":
+            data = {"id": str(random.getrandbits(60)), "application_id": "1", "type": 2, "guild_id": guildId, "channel_id": str(random.getrandbits(60)),
+                    "member": makeMember(sequence), "token": "t"*180, "version": 1,
+                    "data": {"id": "2", "name": "play", "type": 1, "options": [{"name": "query", "type": 3, "value": "some song"}]}}
+        else:
+            data = {"id": guildId, "name": "Guild", "member_count": 500, "roles": [{"id": str(role), "name": f"Role {role}", "permissions": "0"} for role in range(30)],
+                    "channels": [{"id": str(channel), "type": channel % 3, "name": f"channel-{channel}", "position": channel} for channel in range(60)],
+                    "members": [makeMember(member) for member in range(100)], "voice_states": [], "presences": []}
+        payloads.append(json.dumps({"op": 0, "s": sequence, "t": kind, "d": data}))
+    return payloads
+
+
+def loadPayloads(path: Path) -> List[str]:
+    """Loads recorded gateway messages, one JSON message per line."""
+    return [line for line in path.read_text().splitlines() if line.strip()]
+
+
+async def processEvents(payloads: List[str], loads: Callable[[str], Any], dumps: Callable[[Any], str]) -> float:
+    """Decodes each payload and hands it to a dispatcher task the way the gateway does, returning the events per second."""
+    queue: asyncio.Queue = asyncio.Queue()
+    handled = {"count": 0}
+
+    async def dispatcher() -> None:
+        while True:
+            message = await queue.get()
+            if message is None:
+                return
+            # Every event is acknowledged with its sequence number in the heartbeat so the encode side is exercised too
+            if message["s"] % 50 == 0:
+                dumps({"op": 1, "d": message["s"]})
+            handled["count"] += 1
+
+    task = asyncio.create_task(dispatcher())
+    start = time.perf_counter()
+    for number, payload in enumerate(payloads):
+        queue.put_nowait(loads(payload))
+        # The gateway yields to the loop between websocket messages
+        if number % 16 == 0:
+            await asyncio.sleep(0)
+    queue.put_nowait(None)
+    await task
+    return handled["count"]/(time.perf_counter()-start)
+
+
+def runMode(payloads: List[str], fast: bool, repeat: int) -> Dict[str, Any]:
+    """Runs the benchmark in one runtime mode."""
+    results = []
+    for _ in range(repeat):
+        loop = newEventLoop(fast)
+        try:
+            results.append(loop.run_until_complete(processEvents(payloads, discord.utils._from_json, discord.utils._to_json)))
+        finally:
+            loop.close()
+    start = time.perf_counter()
+    for payload in payloads:
+        discord.utils._from_json(payload)
+    return {"uvloop": fast and uvloop is not None,
+            "orjson": getattr(discord.utils, "HAS_ORJSON", False),
+            "eventsPerSecond": max(results),
+            "decodeOnlyPerSecond": len(payloads)/(time.perf_counter()-start)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compares the standard and the uvloop gateway runtimes.")
+    parser.add_argument("--payloads", type=Path, help="A file of recorded gateway messages, one per line.")
+    parser.add_argument("--events", type=int, default=200000, help="How many synthetic events to use without a recording.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Where to write the results as JSON.")
+    arguments = parser.parse_args()
+    payloads = loadPayloads(arguments.payloads) if arguments.payloads else syntheticPayloads(arguments.events)
+    standard = runMode(payloads, False, arguments.repeat)
+    fast = runMode(payloads, True, arguments.repeat)
+    results = {"events": len(payloads),
+               "payloadBytes": sum(len(payload) for payload in payloads),
+               "standard": standard,
+               "fast": fast,
+               "speedup": fast["eventsPerSecond"]/standard["eventsPerSecond"]}
+    print(f"Standard: {standard['eventsPerSecond']:.0f} events/s, fast (uvloop={fast['uvloop']}, py-cord orjson={fast['orjson']}): "
+          f"{fast['eventsPerSecond']:.0f} events/s ({results['speedup']:.2f}x)")
+    if arguments.output:
+        arguments.output.write_text(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
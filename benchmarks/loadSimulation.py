@@ -0,0 +1,247 @@
+"""Drives the Music cog with synthetic interactions from thousands of simulated guilds against a stub Lavalink server.
+
+Everything runs locally so this can be used to gate deploys.
+
+Usage: python -m benchmarks.loadSimulation [--guilds 2000] [--rates 50,100,200,400,800] [--stage-duration 10] [--lag-threshold 0.05]"""
+# Builtin
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from unittest import mock
+# Pip
+import aiohttp
+import lavapy
+# Custom
+from benchmarks.fakes import BenchmarkPlayer, FakeContext
+from benchmarks.stubLavalink import StubLavalink
+from Cogs.Music import Music
+
+# How often each command is issued relative to the others
+commandWeights = {"play": 4, "queue": 3, "next": 2, "shuffle": 1}
+
+
+# Talks to the stub Lavalink server using the same REST and websocket protocol as lavapy
+class StubLavalinkClient:
+    def __init__(self, port: int, password: str = "") -> None:
+        self.url = f"http://127.0.0.1:{port}"
+        self.headers = {"Authorization": password, "User-Id": "1", "Client-Name": "BobBot-LoadSimulation"}
+        self.roundTrips = 0
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.websocket: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._reader: Optional[asyncio.Task] = None
+        self.stats: Dict[str, Any] = {}
+
+    async def connect(self) -> None:
+        self.session = aiohttp.ClientSession(headers=self.headers)
+        self.websocket = await self.session.ws_connect(self.url)
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        async for message in self.websocket:
+            payload = json.loads(message.data)
+            if payload.get("op") == "stats":
+                self.stats = payload
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        await self.websocket.close()
+        await self.session.close()
+
+    async def send(self, payload: Dict[str, Any]) -> None:
+        self.roundTrips += 1
+        await self.websocket.send_json(payload)
+
+    async def loadTracks(self, identifier: str) -> Dict[str, Any]:
+        self.roundTrips += 1
+        async with self.session.get(f"{self.url}/loadtracks", params={"identifier": identifier}) as response:
+            return await response.json()
+
+    async def getTracks(self, cls: type, query: str) -> Any:
+        """Loads tracks from the stub server the same way lavapy's Node.getTracks does."""
+        data = await self.loadTracks(query)
+        tracks = [lavapy.YoutubeTrack(track["track"], track["info"]) for track in data["tracks"]]
+        if data["loadType"] == "PLAYLIST_LOADED":
+            return lavapy.MultiTrack(data["playlistInfo"]["name"], tracks)
+        return tracks or None
+
+    def searchType(self) -> type:
+        """Creates a search type which resolves queries through the stub server."""
+        client = self
+
+        class StubSearch:
+            @classmethod
+            async def search(cls, query: str, partial: bool = False) -> Any:
+                identifier = query if query.startswith("http") else f"ytsearch:{query}"
+                # Like lavapy, partial searches don't contact Lavalink until the track is played
+                if partial and "playlist" not in query:
+                    return lavapy.PartialResource(cls, identifier)
+                tracks = await client.getTracks(cls, identifier)
+                return tracks[0] if isinstance(tracks, list) else tracks
+
+        return StubSearch
+
+
+# Player which sends its operations to the stub Lavalink server
+class LoadPlayer(BenchmarkPlayer):
+    def __init__(self, client: StubLavalinkClient, guildId: int) -> None:
+        # The client answers searches like a node would so partial tracks are resolved through it
+        super().__init__(client, guildId)
+        # Kept apart from client which lavapy uses for the bot that queue_change events are dispatched through
+        self.lavalink = client
+
+    async def play(self, track: Any, *args, **kwargs) -> None:
+        # Mirror lavapy by queueing the rest of a playlist and resolving partial tracks before playing them
+        if isinstance(track, lavapy.MultiTrack):
+            self.enqueue(track)
+            track = track.tracks[0]
+        if isinstance(track, lavapy.PartialResource):
+            track = await self.resolvePartial(track)
+        await self.lavalink.send({"op": "play", "guildId": str(self.guildId), "track": track.id})
+        self.currentTrack = track
+
+    async def destroy(self) -> None:
+        self.prefetcher.clear()
+        await self.lavalink.send({"op": "destroy", "guildId": str(self.guildId)})
+
+
+async def monitorLag(samples: List[float], interval: float = 0.05) -> None:
+    """Records how late the event loop wakes up."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter()-start-interval))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Gets a percentile from a list of values."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values)-1, int(fraction*len(values)))]
+
+
+# Fake gateway which dispatches synthetic slash command interactions to the Music cog
+class FakeGateway:
+    def __init__(self, cog: Music, contexts: List[FakeContext]) -> None:
+        self.cog = cog
+        self.contexts = contexts
+        self.latencies: Dict[str, List[float]] = {command: [] for command in commandWeights}
+        self.errors = 0
+
+    async def dispatch(self, command: str, context: FakeContext) -> None:
+        start = time.perf_counter()
+        try:
+            if command == "play":
+                await Music.play.callback(self.cog, context, random.choice(["song one", "song two", f"playlist {random.randrange(50)}"]))
+            else:
+                await getattr(Music, command).callback(self.cog, context)
+        except Exception:
+            self.errors += 1
+        self.latencies[command].append(time.perf_counter()-start)
+
+    async def runStage(self, rate: float, duration: float) -> Dict[str, Any]:
+        """Dispatches interactions at a given average rate per second for a given amount of time."""
+        for latencies in self.latencies.values():
+            latencies.clear()
+        self.errors = 0
+        lagSamples: List[float] = []
+        lagTask = asyncio.create_task(monitorLag(lagSamples))
+        tasks = []
+        commands, weights = list(commandWeights), list(commandWeights.values())
+        start = time.perf_counter()
+        while time.perf_counter()-start < duration:
+            command = random.choices(commands, weights)[0]
+            tasks.append(asyncio.create_task(self.dispatch(command, random.choice(self.contexts))))
+            # Poisson arrivals
+            await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter()-start
+        lagTask.cancel()
+        allLatencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        return {"targetRate": rate,
+                "throughput": len(allLatencies)/elapsed,
+                "errors": self.errors,
+                "p50": percentile(allLatencies, 0.5),
+                "p99": percentile(allLatencies, 0.99),
+                "perCommand": {command: {"count": len(latencies), "p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99)}
+                               for command, latencies in self.latencies.items()},
+                "loopLagP99": percentile(lagSamples, 0.99),
+                "loopLagMax": max(lagSamples, default=0.0)}
+
+
+async def simulate(guilds: int, rates: List[float], stageDuration: float, lagThreshold: float, latency: float) -> Dict[str, Any]:
+    stub = StubLavalink(latency=latency)
+    port = await stub.start()
+    client = StubLavalinkClient(port)
+    await client.connect()
+    try:
+        with mock.patch("lavapy.decodeQuery", return_value=client.searchType()):
+            cog = Music(None)
+            # Measure how much memory each active player uses once it has a playlist queued
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            contexts = [FakeContext(LoadPlayer(client, guildId)) for guildId in range(guilds)]
+            for context in contexts:
+                context.voice_client.searchCache = cog.searchCache
+            await asyncio.gather(*[Music.play.callback(cog, context, f"playlist {context.voice_client.guildId % 50}") for context in contexts])
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            memoryPerPlayer = sum(stat.size_diff for stat in after.compare_to(before, "filename"))/guilds
+            gateway = FakeGateway(cog, contexts)
+            stages = []
+            breakingRate = None
+            for rate in rates:
+                stage = await gateway.runStage(rate, stageDuration)
+                stages.append(stage)
+                print(f"{rate}/s: throughput={stage['throughput']:.1f}/s p50={stage['p50']*1000:.1f}ms "
+                      f"p99={stage['p99']*1000:.1f}ms loop lag p99={stage['loopLagP99']*1000:.1f}ms errors={stage['errors']}")
+                if stage["loopLagP99"] > lagThreshold:
+                    breakingRate = rate
+                    break
+            for context in contexts:
+                context.voice_client.prefetcher.clear()
+        return {"guilds": guilds,
+                "memoryPerPlayerBytes": memoryPerPlayer,
+                "lagThreshold": lagThreshold,
+                "breakingRate": breakingRate,
+                "lavalinkRoundTrips": client.roundTrips,
+                "searchCache": cog.searchCache.stats,
+                "stages": stages}
+    finally:
+        await client.close()
+        await stub.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs a load simulation against a stub Lavalink server.")
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--rates", type=lambda value: [float(rate) for rate in value.split(",")], default=[50, 100, 200, 400, 800, 1600])
+    parser.add_argument("--stage-duration", type=float, default=10)
+    parser.add_argument("--lag-threshold", type=float, default=0.05, help="Loop lag in seconds which counts as overloaded.")
+    parser.add_argument("--latency", type=float, default=0.005, help="Artificial delay the stub adds to searches in seconds.")
+    parser.add_argument("--output", type=Path, help="Where to write the results as JSON.")
+    parser.add_argument("--max-p99", type=float, help="Exit with an error if the p99 latency of any stage is above this.")
+    arguments = parser.parse_args()
+    results = asyncio.run(simulate(arguments.guilds, arguments.rates, arguments.stage_duration, arguments.lag_threshold, arguments.latency))
+    print(f"Memory per player: {results['memoryPerPlayerBytes']/1024:.1f}KiB, breaking rate: {results['breakingRate']}")
+    if arguments.output:
+        arguments.output.write_text(json.dumps(results, indent=4))
+    # Every stage is gated so a regression which only shows up under heavier load still fails the run
+    failures = []
+    for stage in results["stages"]:
+        if stage["errors"]:
+            failures.append(f"{stage['targetRate']}/s had {stage['errors']} errors")
+        if arguments.max_p99 is not None and stage["p99"] > arguments.max_p99:
+            failures.append(f"{stage['targetRate']}/s had a p99 latency of {stage['p99']:.3f}s which is above {arguments.max_p99}s")
+    if failures:
+        raise SystemExit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
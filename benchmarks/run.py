@@ -0,0 +1,226 @@
+"""Runs the music and pagination benchmarks offline and writes the results as JSON.
+
+Usage: python -m benchmarks.run [--quick] [--output results.json] [--compare baseline.json]"""
+# Builtin
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+from unittest import mock
+# Pip
+import discord
+import lavapy
+# Custom
+from benchmarks.fakes import BenchmarkPlayer, FakeContext, FakeInteraction, StubNode, makeMultiTrack, makeTracks
+from Cogs.Music import Music, QueueView
+from Utils.CompactQueue import CompactQueue
+from Utils.Paginator import PageSource, Paginator
+
+# Path variables
+resultsDirectory = Path(__file__).parent.joinpath("results")
+
+
+def summarise(durations: List[float]) -> Dict[str, float]:
+    """Summarises a list of durations in seconds."""
+    return {"min": min(durations), "median": statistics.median(durations), "mean": statistics.fmean(durations), "runs": len(durations)}
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Times a synchronous function."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter()-start)
+    return summarise(durations)
+
+
+async def measureAsync(func: Callable[[], Awaitable[Any]], repeat: int) -> Dict[str, float]:
+    """Times a coroutine function."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        durations.append(time.perf_counter()-start)
+    return summarise(durations)
+
+
+def buildAllPages(tracks: List[Any], currentTrack: Any) -> List[discord.Embed]:
+    """Builds every queue page up front the way /queue used to."""
+    pages = []
+    splittedTracks = Music.listSplit(tracks, 20)
+    for count, sublist in enumerate(splittedTracks):
+        tempEmbed = discord.Embed(title=f"Page {count+1} of {len(splittedTracks)}")
+        tempEmbed.set_footer(text=f"Track Total: {len(tracks)}")
+        tempDescription = ""
+        for position, track in enumerate(sublist):
+            if track == currentTrack:
+                tempDescription += "► "
+            if isinstance(track, lavapy.Track):
+                tempDescription += f"{(count*20)+position+1}. {track.title} - {track.author}\n"
+            elif isinstance(track, lavapy.PartialResource):
+                tempDescription += f"{(count*20)+position+1}. {track.query} (Partial)\n"
+        tempEmbed.description = tempDescription
+        pages.append(tempEmbed)
+    return pages
+
+
+def benchQueuePages(sizes: List[int], repeat: int) -> Dict[str, Any]:
+    """Compares building every queue page against rendering one page from the queue view."""
+    results = {}
+    for size in sizes:
+        tracks = makeTracks(size, partialEvery=5)
+        queueView = QueueView()
+        queueView.extend(tracks)
+
+        def renderFirstPage() -> discord.Embed:
+            tempEmbed = discord.Embed(title=f"Page 1 of {queueView.pageCount}")
+            tempEmbed.set_footer(text=f"Track Total: {len(queueView)}")
+            tempEmbed.description = queueView.renderPage(0)
+            return tempEmbed
+
+        results[str(size)] = {"buildAllPages": measure(lambda: buildAllPages(tracks, tracks[0]), repeat),
+                              "queueViewExtend": measure(lambda: QueueView().extend(tracks), repeat),
+                              "renderFirstPage": measure(renderFirstPage, repeat)}
+    return results
+
+
+async def benchPaginator(pageCounts: List[int], operations: int) -> Dict[str, Any]:
+    """Measures how many button updates and page changes the paginator handles per second."""
+    results = {}
+    for pageCount in pageCounts:
+        paginator = Paginator(PageSource(pageCount, lambda page: discord.Embed(title=f"Page {page+1}")))
+        interaction = FakeInteraction(discord.Object(id=1))
+        start = time.perf_counter()
+        for number in range(operations):
+            paginator.current_page = number % pageCount
+            paginator.update_buttons()
+        updateButtons = operations/(time.perf_counter()-start)
+        start = time.perf_counter()
+        for number in range(operations):
+            paginator.current_page = number % pageCount
+            await paginator.goto_page(interaction, paginator.current_page)
+        gotoPage = operations/(time.perf_counter()-start)
+        results[str(pageCount)] = {"updateButtonsPerSecond": updateButtons, "gotoPagePerSecond": gotoPage}
+    return results
+
+
+async def benchEnqueue(sizes: List[int], repeat: int) -> Dict[str, Any]:
+    """Measures the cost of adding a large playlist to a player's queue."""
+    results = {}
+    node = StubNode()
+    for size in sizes:
+        multiTrack = makeMultiTrack(size)
+
+        async def enqueue() -> None:
+            player = BenchmarkPlayer(node, 1)
+            player.enqueue(multiTrack)
+            player.prefetcher.clear()
+
+        results[str(size)] = await measureAsync(enqueue, repeat)
+    return results
+
+
+async def benchConcurrentPlay(guildCounts: List[int], latency: float) -> Dict[str, Any]:
+    """Runs /play in many simulated guilds at once against a stub Lavalink node."""
+    results = {}
+    for guildCount in guildCounts:
+        node = StubNode(latency=latency)
+        cog = Music(None)
+        contexts = [FakeContext(BenchmarkPlayer(node, guildId)) for guildId in range(guildCount)]
+        # Half of the guilds search for the same few songs so the search cache gets exercised
+        queries = [f"song {guildId % 10}" if guildId % 2 else f"playlist {guildId}" for guildId in range(guildCount)]
+        with mock.patch("lavapy.decodeQuery", return_value=node.searchType()):
+            start = time.perf_counter()
+            await asyncio.gather(*[Music.play.callback(cog, context, query) for context, query in zip(contexts, queries)])
+            duration = time.perf_counter()-start
+        for context in contexts:
+            context.voice_client.prefetcher.clear()
+        results[str(guildCount)] = {"seconds": duration,
+                                    "commandsPerSecond": guildCount/duration,
+                                    "lavalinkRequests": node.requests,
+                                    "searchCache": cog.searchCache.stats}
+    return results
+
+
+def benchQueueMemory(sizes: List[int]) -> Dict[str, Any]:
+    """Compares the memory used per track by full lavapy tracks and compact queue entries."""
+    results = {}
+    for size in sizes:
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        fullTracks = makeTracks(size)
+        fullBytes = tracemalloc.get_traced_memory()[0]-start
+        del fullTracks
+        start = tracemalloc.get_traced_memory()[0]
+        compactQueue = CompactQueue(None)
+        compactQueue.addIterable(makeTracks(size))
+        compactBytes = tracemalloc.get_traced_memory()[0]-start
+        tracemalloc.stop()
+        del compactQueue
+        results[str(size)] = {"fullBytesPerTrack": fullBytes/size,
+                              "compactBytesPerTrack": compactBytes/size,
+                              "saving": 1-compactBytes/fullBytes}
+    return results
+
+
+async def runBenchmarks(quick: bool) -> Dict[str, Any]:
+    """Runs every benchmark."""
+    repeat = 3 if quick else 10
+    queueSizes = [10, 100, 1000, 5000] if quick else [10, 100, 1000, 5000, 20000, 50000]
+    return {"queuePages": benchQueuePages(queueSizes, repeat),
+            "paginator": await benchPaginator([2, 50, 2500], 1000 if quick else 10000),
+            "queueMemory": benchQueueMemory([1000, 10000] if quick else [1000, 10000, 50000]),
+            "enqueue": await benchEnqueue([100, 1000, 5000] if quick else [100, 1000, 5000, 20000], repeat),
+            "concurrentPlay": await benchConcurrentPlay([10, 100] if quick else [10, 100, 1000], 0.002)}
+
+
+def currentCommit() -> str:
+    """Gets the commit being benchmarked."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], path: str = "") -> List[str]:
+    """Lists how every median and throughput changed compared to a baseline run."""
+    lines = []
+    for key, value in current.items():
+        if key not in baseline:
+            continue
+        if isinstance(value, dict):
+            lines.extend(compare(value, baseline[key], f"{path}{key}."))
+        elif key in ("median", "commandsPerSecond", "updateButtonsPerSecond", "gotoPagePerSecond", "compactBytesPerTrack") and baseline[key]:
+            lines.append(f"{path}{key}: {baseline[key]:.6g} -> {value:.6g} ({value/baseline[key]:.2f}x)")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs the BobBot benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="Uses smaller sizes and fewer repeats.")
+    parser.add_argument("--output", type=Path, help="Where to write the results. Defaults to benchmarks/results/<commit>.json.")
+    parser.add_argument("--compare", type=Path, help="A previous results file to compare against.")
+    arguments = parser.parse_args()
+    commit = currentCommit()
+    results = {"commit": commit,
+               "python": platform.python_version(),
+               "timestamp": time.time(),
+               "quick": arguments.quick,
+               "results": asyncio.run(runBenchmarks(arguments.quick))}
+    output = arguments.output or resultsDirectory.joinpath(f"{commit}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=4))
+    print(f"Results written to {output}")
+    if arguments.compare:
+        print("\n".join(compare(results["results"], json.loads(arguments.compare.read_text())["results"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""A local stand-in for a Lavalink v3 server which speaks the REST and websocket protocol lavapy uses.
+
+Usage: python -m benchmarks.stubLavalink [--port 2333] [--password ""] [--latency 0.005]"""
+# Builtin
+import argparse
+import asyncio
+import base64
+import json
+import time
+from typing import Any, Dict, List, Optional
+# Pip
+import aiohttp
+from aiohttp import web
+
+
+def encodeTrack(identifier: str) -> str:
+    """Creates a fake encoded track blob which the stub can decode again."""
+    return base64.b64encode(f"stub:{identifier}".encode()).decode()
+
+
+def decodeTrack(track: str) -> str:
+    """Gets the identifier back out of a fake encoded track blob."""
+    return base64.b64decode(track.encode()).decode().removeprefix("stub:")
+
+
+def trackInfo(identifier: str) -> Dict[str, Any]:
+    """Creates the track info Lavalink sends for a track."""
+    return {"identifier": identifier,
+            "isSeekable": True,
+            "author": f"Stub Author {hash(identifier) % 500}",
+            "length": 180000,
+            "isStream": False,
+            "position": 0,
+            "title": f"Stub Track {identifier}",
+            "uri": f"https://www.youtube.com/watch?v={identifier}",
+            "sourceName": "youtube"}
+
+
+# Lavalink server which answers searches with generated tracks and acknowledges player operations
+class StubLavalink:
+    def __init__(self, password: str = "", latency: float = 0.005, playlistSize: int = 100, statsInterval: float = 1) -> None:
+        self.password = password
+        self.latency = latency
+        self.playlistSize = playlistSize
+        self.statsInterval = statsInterval
+        self.players: Dict[str, Dict[str, Any]] = {}
+        self.restRequests = 0
+        self.websocketMessages = 0
+        self.cpuLoad = 0.0
+        self.frameDeficit = 0
+        self.started = time.time()
+        self._sockets: List[web.WebSocketResponse] = []
+        self._runner: Optional[web.AppRunner] = None
+        self.app = web.Application(middlewares=[self._authenticate])
+        self.app.router.add_get("/", self._websocket)
+        self.app.router.add_get("/loadtracks", self._loadTracks)
+        self.app.router.add_get("/decodetrack", self._decodeTrack)
+        self.app.router.add_post("/decodetracks", self._decodeTracks)
+
+    @web.middleware
+    async def _authenticate(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        if request.headers.get("Authorization", "") != self.password:
+            return web.Response(status=401)
+        return await handler(request)
+
+    async def _loadTracks(self, request: web.Request) -> web.Response:
+        self.restRequests += 1
+        await asyncio.sleep(self.latency)
+        identifier = request.query.get("identifier", "")
+        query = identifier.partition(":")[2] if identifier.startswith(("ytsearch:", "scsearch:", "ytmsearch:")) else identifier
+        if "nothing" in query:
+            return web.json_response({"loadType": "NO_MATCHES", "playlistInfo": {}, "tracks": []})
+        if "playlist" in query:
+            tracks = [f"{query}-{number}" for number in range(self.playlistSize)]
+            return web.json_response({"loadType": "PLAYLIST_LOADED",
+                                      "playlistInfo": {"name": f"Stub Playlist {query}", "selectedTrack": -1},
+                                      "tracks": [{"track": encodeTrack(track), "info": trackInfo(track)} for track in tracks]})
+        loadType = "SEARCH_RESULT" if identifier != query else "TRACK_LOADED"
+        tracks = [f"{query}-{number}" for number in range(5 if loadType == "SEARCH_RESULT" else 1)]
+        return web.json_response({"loadType": loadType,
+                                  "playlistInfo": {},
+                                  "tracks": [{"track": encodeTrack(track), "info": trackInfo(track)} for track in tracks]})
+
+    async def _decodeTrack(self, request: web.Request) -> web.Response:
+        self.restRequests += 1
+        return web.json_response(trackInfo(decodeTrack(request.query.get("track", ""))))
+
+    async def _decodeTracks(self, request: web.Request) -> web.Response:
+        self.restRequests += 1
+        return web.json_response([{"track": track, "info": trackInfo(decodeTrack(track))} for track in await request.json()])
+
+    def stats(self) -> Dict[str, Any]:
+        """Creates the stats payload Lavalink periodically sends."""
+        return {"op": "stats",
+                "players": len(self.players),
+                "playingPlayers": sum(1 for player in self.players.values() if player.get("track") and not player.get("paused")),
+                "uptime": int((time.time()-self.started)*1000),
+                "memory": {"free": 0, "used": 0, "allocated": 0, "reservable": 0},
+                "cpu": {"cores": 4, "systemLoad": self.cpuLoad, "lavalinkLoad": self.cpuLoad},
+                "frameStats": {"sent": 3000*len(self.players), "nulled": 0, "deficit": self.frameDeficit}}
+
+    async def _sendStats(self, socket: web.WebSocketResponse) -> None:
+        while not socket.closed:
+            await socket.send_json(self.stats())
+            await asyncio.sleep(self.statsInterval)
+
+    async def _handleOp(self, socket: web.WebSocketResponse, payload: Dict[str, Any]) -> None:
+        """Applies a player operation and sends back the events Lavalink would."""
+        guildId = payload.get("guildId")
+        op = payload.get("op")
+        player = self.players.setdefault(guildId, {"track": None, "paused": False, "volume": 100, "position": 0})
+        if op == "play":
+            if player["track"] is not None:
+                await socket.send_json({"op": "event", "type": "TrackEndEvent", "guildId": guildId, "track": player["track"], "reason": "REPLACED"})
+            player.update(track=payload["track"], position=int(payload.get("startTime", 0)), paused=payload.get("pause", False))
+            await socket.send_json({"op": "event", "type": "TrackStartEvent", "guildId": guildId, "track": payload["track"]})
+        elif op == "stop":
+            if player["track"] is not None:
+                await socket.send_json({"op": "event", "type": "TrackEndEvent", "guildId": guildId, "track": player["track"], "reason": "STOPPED"})
+            player["track"] = None
+        elif op == "pause":
+            player["paused"] = payload.get("pause", True)
+        elif op == "volume":
+            player["volume"] = payload.get("volume", 100)
+        elif op == "seek":
+            player["position"] = payload.get("position", 0)
+        elif op == "destroy":
+            self.players.pop(guildId, None)
+            return
+        await socket.send_json({"op": "playerUpdate", "guildId": guildId, "state": {"time": int(time.time()*1000), "position": player["position"], "connected": True}})
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        self._sockets.append(socket)
+        statsTask = asyncio.create_task(self._sendStats(socket))
+        try:
+            async for message in socket:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self.websocketMessages += 1
+                    await self._handleOp(socket, json.loads(message.data))
+        finally:
+            statsTask.cancel()
+            self._sockets.remove(socket)
+        return socket
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Starts the server and returns the port it is listening on."""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        return self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        """Closes every websocket and stops the server."""
+        for socket in list(self._sockets):
+            await socket.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def serve(port: int, password: str, latency: float) -> None:
+    stub = StubLavalink(password=password, latency=latency)
+    await stub.start(port=port)
+    print(f"Stub Lavalink listening on 127.0.0.1:{port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a stub Lavalink server.")
+    parser.add_argument("--port", type=int, default=2333)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--latency", type=float, default=0.005, help="Artificial delay added to searches in seconds.")
+    arguments = parser.parse_args()
+    asyncio.run(serve(arguments.port, arguments.password, arguments.latency))
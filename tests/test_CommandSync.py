@@ -0,0 +1,76 @@
+# Builtin
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+# Pip
+import pytest
+
+pytest.importorskip("discord")
+# Custom
+from Utils.CommandSync import CommandSync
+
+applicationId = 1
+
+
+class FakeHttp:
+    def __init__(self, registered: List[Dict[str, Any]]) -> None:
+        self.registered = registered
+        self.calls: List[Tuple[Any, ...]] = []
+        self._nextId = 100
+
+    async def get_global_commands(self, applicationId: int) -> List[Dict[str, Any]]:
+        self.calls.append(("fetch",))
+        # Give other syncs a chance to run in between like a real request would
+        await asyncio.sleep(0)
+        return self.registered
+
+    async def upsert_global_command(self, applicationId: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls.append(("create", payload["name"]))
+        await asyncio.sleep(0)
+        self._nextId += 1
+        return {"id": str(self._nextId), **payload}
+
+    async def edit_global_command(self, applicationId: int, commandId: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls.append(("update", payload["name"], commandId))
+        await asyncio.sleep(0)
+        return {"id": str(commandId), **payload}
+
+    async def delete_global_command(self, applicationId: int, commandId: int) -> None:
+        self.calls.append(("delete", commandId))
+        await asyncio.sleep(0)
+
+
+def payload(name: str, description: str = "Does something") -> Dict[str, Any]:
+    return {"name": name, "description": description}
+
+
+def test_syncDiff(tmp_path: Path) -> None:
+    async def run() -> None:
+        http = FakeHttp([{"id": "1", "name": "play"}, {"id": "2", "name": "old"}, {"id": "3", "name": "lazy"}])
+        commandSync = CommandSync(http, tmp_path.joinpath("commands.json"))
+        await commandSync.sync(applicationId, {None: {"play": payload("play"), "queue": payload("queue")}}, keep={"lazy"})
+        assert sorted(http.calls[1:]) == [("create", "queue"), ("delete", 2), ("update", "play", 1)]
+        # Unchanged commands aren't sent again and changed ones are updated by their ID
+        http.calls.clear()
+        results = await commandSync.sync(applicationId, {None: {"play": payload("play", "Plays a track"), "queue": payload("queue")}}, keep={"lazy"})
+        assert http.calls == [("update", "play", 1)]
+        assert results["global"]["ids"] == {"play": 1, "lazy": 3, "queue": 101}
+        # The manifest is reloaded on restart so nothing is sent
+        http.calls.clear()
+        restarted = CommandSync(http, tmp_path.joinpath("commands.json"))
+        await restarted.sync(applicationId, {None: {"play": payload("play", "Plays a track"), "queue": payload("queue")}}, keep={"lazy"})
+        assert http.calls == []
+
+    asyncio.run(run())
+
+
+def test_concurrentSyncsCreateOnce(tmp_path: Path) -> None:
+    async def run() -> None:
+        http = FakeHttp([])
+        commandSync = CommandSync(http, tmp_path.joinpath("commands.json"))
+        scopes = {None: {"play": payload("play")}}
+        await asyncio.gather(*[commandSync.sync(applicationId, scopes) for _ in range(3)])
+        assert http.calls.count(("create", "play")) == 1
+        assert commandSync.registeredId(None, "play") == 101
+
+    asyncio.run(run())
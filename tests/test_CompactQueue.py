@@ -0,0 +1,38 @@
+# Builtin
+from types import SimpleNamespace
+# Pip
+import pytest
+
+lavapy = pytest.importorskip("lavapy")
+# Custom
+from Utils.CompactQueue import CompactQueue
+from tests.test_TrackStore import makeTrack
+
+
+def makeQueue(amount: int, repeating: bool = False) -> CompactQueue:
+    queue = CompactQueue(SimpleNamespace(isRepeating=repeating))
+    queue.addIterable(makeTrack() for _ in range(amount))
+    return queue
+
+
+def test_nextAtEndOfQueue() -> None:
+    queue = makeQueue(2)
+    assert queue.next().id == makeTrack().id
+    assert queue.isEmpty
+    with pytest.raises(lavapy.QueueEmpty):
+        queue.next()
+    assert queue.position == 1
+
+
+def test_endOfQueueBeforeRepeat() -> None:
+    # Matches lavapy's queue where reaching either end is reported before repeating
+    queue = makeQueue(2, repeating=True)
+    with pytest.raises(lavapy.QueueEmpty):
+        queue.previous()
+    with pytest.raises(lavapy.RepeatException):
+        queue.next()
+    queue.skipTo(1)
+    with pytest.raises(lavapy.QueueEmpty):
+        queue.next()
+    with pytest.raises(lavapy.RepeatException):
+        queue.previous()
@@ -0,0 +1,31 @@
+# Builtin
+import asyncio
+# Pip
+import pytest
+
+pytest.importorskip("lavapy")
+pytest.importorskip("discord")
+# The Music cog reads its settings from the deployment's config
+pytest.importorskip("Config")
+# Custom
+from benchmarks.fakes import BenchmarkPlayer, makeTrack
+from Cogs.Music import Music, playerReaper
+
+
+def test_trackEndStartsIdleTimer() -> None:
+    async def run() -> None:
+        player = BenchmarkPlayer(None, 1)
+        player.channel = None
+        player.currentTrack = makeTrack(1)
+        playerReaper.update(player)
+        assert 1 not in playerReaper._wheel
+        # Lavapy clears the track before dispatching the event
+        track, player.currentTrack = player.currentTrack, None
+        await Music.on_lavapy_track_end(Music(None), player, track, "FINISHED")
+        try:
+            assert playerReaper._reasons[1] == "idle"
+            assert 1 in playerReaper._wheel
+        finally:
+            playerReaper.remove(player)
+
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+# Builtin
+import asyncio
+from typing import Any, Dict, Hashable, List
+# Pip
+import pytest
+
+lavapy = pytest.importorskip("lavapy")
+# Custom
+from Utils.SearchCache import SearchCache
+from tests.test_TrackStore import makeTrack
+
+
+class FakeNode:
+    def __init__(self) -> None:
+        self.queries: List[str] = []
+
+    async def getTracks(self, cls: type, query: str) -> List["lavapy.Track"]:
+        self.queries.append(query)
+        return [makeTrack()]
+
+
+class FakeStore:
+    def __init__(self) -> None:
+        self.saved: Dict[Hashable, Any] = {}
+
+    def put(self, key: Hashable, result: Any) -> None:
+        self.saved[key] = result
+
+    async def get(self, key: Hashable) -> Any:
+        return self.saved.get(key)
+
+
+class PartialSearch:
+    @classmethod
+    async def search(cls, query: str, partial: bool = False) -> "lavapy.PartialResource":
+        return lavapy.PartialResource(lavapy.YoutubeTrack, f"ytsearch:{query}")
+
+
+def test_resolveUsesPrefixedQuery() -> None:
+    async def run() -> None:
+        cache = SearchCache()
+        node = FakeNode()
+        partial = await cache.search(PartialSearch, "never gonna", partial=True)
+        first = await cache.resolve(node, partial)
+        second = await cache.resolve(node, lavapy.PartialResource(lavapy.YoutubeTrack, "ytsearch:never gonna"))
+        assert node.queries == ["ytsearch:never gonna"]
+        assert first is second
+
+    asyncio.run(run())
+
+
+def test_resolvedTrackReplacesPartialSearch() -> None:
+    async def run() -> None:
+        store = FakeStore()
+        cache = SearchCache(store=store)
+        partial = await cache.search(PartialSearch, "never gonna", partial=True)
+        assert isinstance(partial, lavapy.PartialResource)
+        track = await cache.resolve(FakeNode(), partial)
+        assert await cache.search(PartialSearch, "Never  Gonna", partial=True) is track
+        assert store.saved[cache.makeKey(PartialSearch, "never gonna", partial=True)] is track
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+# Pip
+import pytest
+
+lavapy = pytest.importorskip("lavapy")
+# Custom
+from Utils.TrackStore import TrackStore
+
+
+def makeTrack() -> "lavapy.YoutubeTrack":
+    return lavapy.YoutubeTrack("QAAAjQIAJVJpY2sgQXN0bGV5IC0gTmV2ZXIgR29ubmEgR2l2ZSBZb3UgVXA=",
+                               {"identifier": "dQw4w9WgXcQ",
+                                "isSeekable": True,
+                                "author": "Rick Astley",
+                                "length": 212000,
+                                "isStream": False,
+                                "position": 0,
+                                "sourceName": "youtube",
+                                "title": "Never Gonna Give You Up",
+                                "uri": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"})
+
+
+def assertSameTrack(original: "lavapy.Track", restored: "lavapy.Track") -> None:
+    assert type(restored) is type(original)
+    assert restored.id == original.id
+    assert TrackStore.trackInfo(restored) == TrackStore.trackInfo(original)
+
+
+def test_trackRoundTrip() -> None:
+    track = makeTrack()
+    data = TrackStore.serialize(track)
+    assert data is not None
+    assertSameTrack(track, TrackStore.deserialize(data))
+
+
+def test_multiTrackRoundTrip() -> None:
+    playlist = lavapy.YoutubePlaylist("Playlist", [makeTrack(), makeTrack()])
+    restored = TrackStore.deserialize(TrackStore.serialize(playlist))
+    assert type(restored) is lavapy.YoutubePlaylist
+    assert restored.name == "Playlist"
+    assert len(restored.tracks) == 2
+    for original, track in zip(playlist.tracks, restored.tracks):
+        assertSameTrack(original, track)